@@ -4,6 +4,8 @@ Main entry point for the Flask blog application.
 This script initializes and runs the Flask application using the application factory pattern.
 To run the application, execute this script directly. For example:
     $ python app.py
+In production, serve it with `flask serve` instead, which forks several
+worker processes.
 """
 from flaskblog import create_app
 
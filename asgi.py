@@ -0,0 +1,13 @@
+"""
+ASGI entry point for the Flask blog application.
+
+The hot read routes (home page, post page, user pages) and the like toggle are
+served by async handlers on an asyncio database engine; every other route runs
+the regular Flask views in a thread pool. Serve it with any ASGI server, for
+example:
+    $ uvicorn asgi:app --workers 4
+"""
+from flaskblog import create_app
+from flaskblog.aio import create_asgi_app
+
+app = create_asgi_app(create_app())
@@ -0,0 +1,219 @@
+"""
+Benchmarks the ASGI app with and without its async views under many slow clients.
+
+The script builds a throwaway SQLite database, then serves it twice with
+uvicorn and the same `AsyncApp`:
+
+    sync   every route runs the Flask views in the ASGI_THREADS thread pool
+    async  the home, post and user pages run as async views on aiosqlite
+
+Each run is hit by many concurrent clients that trickle their requests and
+read responses in small pieces. Every SQL statement is delayed by
+`--db-latency` seconds to stand in for a database across the network, which
+is when a synchronous view holds its thread the longest. The script reports
+throughput and latency percentiles for both runs. Run it from the repository
+root:
+
+    $ python benchmarks/asgi_slow_clients.py --clients 200 --duration 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, func, insert, select, update
+
+from flaskblog import create_app, db
+from flaskblog.config import Config
+from flaskblog.models import User, Post, Comment, Like
+from flaskblog.posts.utils import comment_path
+from flaskblog.users.utils import repair_user_stats
+
+
+def build_app(path, threads, pool_size):
+    class BenchConfig(Config):
+        SECRET_KEY = "bench"
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{path}"
+        SQLALCHEMY_ENGINE_OPTIONS = {"pool_size": pool_size, "max_overflow": 0}
+        ASYNC_SQLALCHEMY_ENGINE_OPTIONS = {"pool_size": pool_size, "max_overflow": 0}
+        ASGI_THREADS = threads
+
+    return create_app(BenchConfig)
+
+
+def seed(path, users, posts, comments, rng):
+    app = build_app(path, 1, 1)
+    with app.app_context():
+        with db.engine.connect() as connection:
+            # Let the view count flushes write while pages are being read.
+            connection.exec_driver_sql("PRAGMA journal_mode=WAL")
+        db.create_all()
+        now = datetime.utcnow()
+        db.session.execute(insert(User), [
+            {"id": i, "username": f"user{i}", "email": f"user{i}@example.com", "password": "x"}
+            for i in range(1, users + 1)
+        ])
+        db.session.execute(insert(Post), [
+            {"id": i, "title": f"Post {i}", "content": "Lorem ipsum dolor sit amet. " * 20,
+             "user_id": rng.randint(1, users), "date": now - timedelta(minutes=i)}
+            for i in range(1, posts + 1)
+        ])
+        db.session.execute(insert(Comment), [
+            {"id": i, "content": "Nice post!", "user_id": rng.randint(1, users), "post_id": rng.randint(1, posts),
+             "date_posted": now, "path": comment_path(i)}
+            for i in range(1, comments + 1)
+        ])
+        likes = {(rng.randint(1, users), rng.randint(1, posts)) for _ in range(comments)}
+        db.session.execute(insert(Like), [{"user_id": u, "post_id": p} for u, p in likes])
+        db.session.execute(update(Post).values(
+            like_count=select(func.count()).where(Like.post_id == Post.id).scalar_subquery()
+        ))
+        db.session.commit()
+        repair_user_stats()
+
+
+def serve(args):
+    """
+    Runs one server; used as the subprocess of a benchmark run.
+    """
+    import uvicorn
+    from flaskblog.aio import AsyncApp
+
+    def slow_statements(connection):
+        # sqlite3 calls the trace callback in the thread running the statement:
+        # a pool thread for the sync views, aiosqlite's thread for async ones.
+        connection.set_trace_callback(lambda statement: time.sleep(args.db_latency))
+
+    app = build_app(args.db, args.threads, args.connections)
+    with app.app_context():
+        event.listen(db.engine, "connect", lambda dbapi, record: slow_statements(dbapi))
+    asgi = AsyncApp(app, views={} if args.serve == "sync" else None)
+    event.listen(asgi.engine.sync_engine, "connect",
+                 lambda dbapi, record: slow_statements(dbapi.driver_connection._conn))
+    uvicorn.run(asgi, host="127.0.0.1", port=args.port, log_level="warning", backlog=4096)
+
+
+async def slow_request(port, path, delay):
+    """
+    Sends a request in small pieces and reads the response slowly.
+
+    Returns:
+        int: The HTTP status code.
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        request = f"GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode()
+        for i in range(0, len(request), 16):
+            writer.write(request[i:i + 16])
+            await writer.drain()
+            await asyncio.sleep(delay)
+        status = int((await reader.readline()).split()[1])
+        while await reader.read(1024):
+            await asyncio.sleep(delay)
+        return status
+    finally:
+        writer.close()
+
+
+async def load(port, paths, clients, duration, delay):
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+
+    async def client():
+        nonlocal errors
+        while time.monotonic() < deadline:
+            start = time.monotonic()
+            try:
+                status = await slow_request(port, random.choice(paths), delay)
+            except (OSError, ValueError, IndexError):
+                status = None
+            if status == 200:
+                latencies.append(time.monotonic() - start)
+            else:
+                errors += 1
+
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return latencies, errors
+
+
+def wait_for_port(port, timeout=20):
+    import socket
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def run(mode, args, paths):
+    port = args.port
+    command = [sys.executable, os.path.abspath(__file__), "--serve", mode, "--db", args.db,
+               "--port", str(port), "--db-latency", str(args.db_latency),
+               "--threads", str(args.threads), "--connections", str(args.connections)]
+    server = subprocess.Popen(command)
+    try:
+        wait_for_port(port)
+        latencies, errors = asyncio.run(load(port, paths, args.clients, args.duration, args.client_delay))
+    finally:
+        server.terminate()
+        server.wait()
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0
+
+    print(f"{mode:>6}  {len(latencies) / args.duration:8.1f} req/s  "
+          f"median {statistics.median(latencies) * 1000 if latencies else 0:7.1f} ms  "
+          f"p95 {percentile(0.95):7.1f} ms  p99 {percentile(0.99):7.1f} ms  errors {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=200, help="Concurrent slow clients.")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds of load per run.")
+    parser.add_argument("--threads", type=int, default=32, help="ASGI_THREADS for the sync views.")
+    parser.add_argument("--connections", type=int, default=32, help="Database pool size of both engines.")
+    parser.add_argument("--db-latency", type=float, default=0.005, help="Seconds added to every SQL statement.")
+    parser.add_argument("--client-delay", type=float, default=0.01,
+                        help="Seconds a client pauses between request and response chunks.")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--posts", type=int, default=1000)
+    parser.add_argument("--comments", type=int, default=5000)
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--serve", choices=["sync", "async"], help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        args.db = os.path.join(tmp, "bench.db")
+        seed(args.db, args.users, args.posts, args.comments, rng)
+        paths = (["/", "/home?page=2", "/home?page=3"]
+                 + [f"/post/{rng.randint(1, args.posts)}" for _ in range(20)]
+                 + [f"/user/user{rng.randint(1, args.users)}" for _ in range(10)])
+        print(f"{args.clients} slow clients, {args.db_latency * 1000:.0f} ms per statement, "
+              f"{args.threads} threads, {args.connections} connections, {args.duration:.0f} s per run")
+        for mode in ("sync", "async"):
+            run(mode, args, paths)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmarks the write amplification and read cost of timeline fan-out.
+
+The script builds a throwaway SQLite database with a skewed follow graph (a
+few very popular authors and many ordinary ones), publishes posts, and reads
+timelines under three strategies:
+
+    push    every post is fanned out on write (FEED_FANOUT_LIMIT = infinity)
+    pull    no post is fanned out; timelines are merged on read (limit = -1)
+    hybrid  only authors at or below FEED_FANOUT_LIMIT are fanned out
+
+For each strategy it reports timeline rows written, publish time and read
+latency. Run it from the repository root:
+
+    $ python benchmarks/timeline_fanout.py --users 2000 --posts 500
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import bindparam, func, insert, select
+
+from flaskblog import create_app, db
+from flaskblog.config import Config
+from flaskblog.main.utils import fan_out_post, timeline_query
+from flaskblog.models import User, Post, Follow, TimelineEntry
+
+
+def build_app(path, fanout_limit):
+    class BenchConfig(Config):
+        SECRET_KEY = "bench"
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{path}"
+        FEED_FANOUT_LIMIT = fanout_limit
+
+    return create_app(BenchConfig)
+
+
+def seed(users, celebrities, follows_per_user, rng):
+    db.session.execute(insert(User), [
+        {"id": i, "username": f"user{i}", "email": f"user{i}@example.com", "password": "x"}
+        for i in range(1, users + 1)
+    ])
+    edges = set()
+    for follower in range(1, users + 1):
+        # Everybody follows the celebrities, plus a few random authors.
+        for followed in range(1, celebrities + 1):
+            edges.add((follower, followed))
+        for followed in rng.sample(range(1, users + 1), follows_per_user):
+            edges.add((follower, followed))
+    edges = [edge for edge in edges if edge[0] != edge[1]]
+    db.session.execute(insert(Follow), [{"follower_id": a, "followed_id": b} for a, b in edges])
+    counts = db.session.execute(select(Follow.followed_id, func.count()).group_by(Follow.followed_id)).all()
+    db.session.execute(
+        User.__table__.update().where(User.id == bindparam("uid")).values(followers_count=bindparam("n")),
+        [{"uid": uid, "n": n} for uid, n in counts],
+    )
+    db.session.commit()
+
+
+def run(strategy, fanout_limit, args):
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        app = build_app(os.path.join(tmp, "bench.db"), fanout_limit)
+        with app.app_context():
+            db.create_all()
+            seed(args.users, args.celebrities, args.follows, rng)
+
+            authors = [1 + (i % args.celebrities) if rng.random() < args.celebrity_share
+                       else rng.randint(args.celebrities + 1, args.users) for i in range(args.posts)]
+            start = time.perf_counter()
+            for author_id in authors:
+                post = Post(title="t", content="c", user_id=author_id)
+                db.session.add(post)
+                db.session.flush()
+                fan_out_post(post)
+                db.session.commit()
+            write_time = time.perf_counter() - start
+            rows = db.session.scalar(select(func.count()).select_from(TimelineEntry))
+
+            readers = [db.session.get(User, rng.randint(1, args.users)) for _ in range(args.reads)]
+            latencies = []
+            for reader in readers:
+                start = time.perf_counter()
+                db.session.scalars(timeline_query(reader, limit=10)).all()
+                latencies.append(time.perf_counter() - start)
+            db.session.remove()
+
+    print(f"{strategy:<8} {rows:>12} {rows / args.posts:>12.1f} {write_time * 1000 / args.posts:>14.3f} "
+          f"{statistics.median(latencies) * 1000:>12.3f} {sorted(latencies)[int(len(latencies) * 0.95)] * 1000:>12.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--celebrities", type=int, default=5)
+    parser.add_argument("--follows", type=int, default=20, help="Random follows per user.")
+    parser.add_argument("--posts", type=int, default=500)
+    parser.add_argument("--celebrity-share", type=float, default=0.2, help="Share of posts written by celebrities.")
+    parser.add_argument("--reads", type=int, default=200)
+    parser.add_argument("--fanout-limit", type=int, default=Config.FEED_FANOUT_LIMIT)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'strategy':<8} {'rows':>12} {'rows/post':>12} {'ms/publish':>14} {'read p50 ms':>12} {'read p95 ms':>12}")
+    run("push", float("inf"), args)
+    run("pull", -1, args)
+    run("hybrid", args.fanout_limit, args)
+
+
+if __name__ == "__main__":
+    main()
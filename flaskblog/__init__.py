@@ -1,10 +1,20 @@
+import sqlite3
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from flask_login import LoginManager
 from flask_mail import Mail
 from flask_migrate import Migrate
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import configure_mappers
+from flaskblog.availability import AvailabilityIndex
 from flaskblog.config import Config
+from flaskblog.counters import ViewCounter
+from flaskblog.events import EventHub
+from flaskblog.ratelimit import RateLimiter
+from flaskblog.readonly import ReadOnlyMode
+from flaskblog.storage import MediaStorage
 
 
 
@@ -15,6 +25,27 @@ login_manager.login_view = "users.login"
 login_manager.login_message_category = "info"
 mail = Mail()
 migrate = Migrate()
+view_counter = ViewCounter()
+limiter = RateLimiter()
+storage = MediaStorage()
+events = EventHub()
+read_only = ReadOnlyMode()
+availability = AvailabilityIndex()
+
+
+@event.listens_for(Engine, "connect")
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    """
+    Turns on foreign key enforcement for every new SQLite connection.
+
+    SQLite ignores `ON DELETE CASCADE` unless this pragma is set, and the
+    models rely on the database to delete the likes, comments and other
+    children of a post.
+    """
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
 
 
 
@@ -24,8 +55,9 @@ def create_app(config_class=Config):
 
     This function implements the application factory pattern, which allows for
     the creation of multiple application instances with different configurations.
-    It initializes the database, bcrypt, login manager, mail, and migration
-    services, and registers all blueprints.
+    It initializes the database, bcrypt, login manager, mail, migration, view
+    counting, rate limiting, media storage, live event, read-only mode and
+    username availability services, and registers all blueprints.
 
     Args:
         config_class (object): The configuration class to use for the application.
@@ -42,15 +74,38 @@ def create_app(config_class=Config):
     login_manager.init_app(app)
     mail.init_app(app)
     migrate.init_app(app, db)
+    view_counter.init_app(app, db)
+    limiter.init_app(app)
+    storage.init_app(app)
+    events.init_app(app)
+    read_only.init_app(app)
+    availability.init_app(app, db)
 
     from flaskblog.users.routes import users
     from flaskblog.posts.routes import posts
     from flaskblog.main.routes import main
     from flaskblog.errors.handlers import errors
+    from flaskblog.feeds.routes import feeds
+    from flaskblog.posts.commands import posts_cli
+    from flaskblog.users.commands import users_cli
+    from flaskblog.querycheck import check_query_plans
+    from flaskblog.server import serve
+    from flaskblog.readonly import read_only_cli
 
     app.register_blueprint(users)
     app.register_blueprint(posts)
     app.register_blueprint(main)
     app.register_blueprint(errors)
+    app.register_blueprint(feeds)
+
+    app.cli.add_command(posts_cli)
+    app.cli.add_command(users_cli)
+    app.cli.add_command(check_query_plans)
+    app.cli.add_command(serve)
+    app.cli.add_command(read_only_cli)
+
+    # Create backref attributes such as `Post.author` now rather than on the
+    # first query, since some queries name them in loader options.
+    configure_mappers()
 
     return app
\ No newline at end of file
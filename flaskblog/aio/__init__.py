@@ -0,0 +1,313 @@
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+from flask import g, request, session as flask_session
+from flask_login.config import COOKIE_NAME
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from flaskblog import db, view_counter
+from flaskblog.aio.views import views as default_views
+from flaskblog.events import ASYNC_STREAMS_ENVIRON_KEY
+from flaskblog.models import User
+
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def async_database_url(app):
+    """
+    Returns the URL of the async database engine for an application.
+
+    `ASYNC_SQLALCHEMY_DATABASE_URI` wins when set; otherwise the URL of the
+    app's regular engine is reused with an asyncio driver.
+
+    Args:
+        app (Flask): The application.
+
+    Returns:
+        The database URL.
+    """
+    if app.config.get("ASYNC_SQLALCHEMY_DATABASE_URI"):
+        return app.config["ASYNC_SQLALCHEMY_DATABASE_URI"]
+    with app.app_context():
+        url = db.engine.url
+    driver = _ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver known for {url.get_backend_name()}; "
+                         "set ASYNC_SQLALCHEMY_DATABASE_URI")
+    return url.set(drivername=driver)
+
+
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    """
+    The aiosqlite counterpart of `flaskblog.enable_sqlite_foreign_keys`.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def build_environ(scope, body):
+    """
+    Translates an ASGI HTTP scope and request body into a WSGI environ.
+
+    Args:
+        scope (dict): The ASGI connection scope.
+        body: A file object holding the request body.
+
+    Returns:
+        dict: The WSGI environ.
+    """
+    script_name = scope.get("root_path", "").encode("utf8").decode("latin1")
+    path_info = scope["path"].encode("utf8").decode("latin1")
+    if path_info.startswith(script_name):
+        path_info = path_info[len(script_name):]
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": script_name,
+        "PATH_INFO": path_info,
+        "QUERY_STRING": scope["query_string"].decode("latin1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+    for name, value in scope["headers"]:
+        name = name.decode("latin1")
+        if name == "content-length":
+            key = "CONTENT_LENGTH"
+        elif name == "content-type":
+            key = "CONTENT_TYPE"
+        else:
+            key = "HTTP_" + name.upper().replace("-", "_")
+        value = value.decode("latin1")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _headers(headers):
+    return [(name.lower().encode("latin1"), value.encode("latin1")) for name, value in headers]
+
+
+class AsyncApp:
+    """
+    ASGI application serving the blog with async handlers for hot read routes.
+
+    Requests for endpoints that have an async view (see
+    `flaskblog.aio.views`) are handled on the event loop: their queries run
+    on an SQLAlchemy asyncio engine, so a request waiting on the database
+    holds no thread. The views render the same templates inside a regular
+    Flask request context, so sessions, flashed messages, CSRF tokens, error
+    handlers and `current_user` behave as in the synchronous app.
+
+    An async view may return a response whose body is an async iterator,
+    such as an event stream; it is sent as it is produced and stopped as soon
+    as the client disconnects.
+
+    Every other request goes to the Flask WSGI app, which runs in a pool of
+    `ASGI_THREADS` threads, so all existing blueprints keep working unchanged.
+
+    The async engine is configured from `ASYNC_SQLALCHEMY_DATABASE_URI` and
+    `ASYNC_SQLALCHEMY_ENGINE_OPTIONS` (keyword arguments for
+    `create_async_engine`, such as `pool_size`).
+
+    Args:
+        app (Flask): The application created by `create_app`.
+        views (dict): Async views keyed by endpoint name. Defaults to every
+                      view registered in `flaskblog.aio.views`; pass an empty
+                      dict to serve everything through the WSGI app.
+    """
+
+    def __init__(self, app, views=None):
+        self.app = app
+        self.views = default_views if views is None else views
+        self.executor = ThreadPoolExecutor(max_workers=app.config.get("ASGI_THREADS", 32),
+                                           thread_name_prefix="wsgi")
+
+        url = make_url(async_database_url(app))
+        options = dict(app.config.get("ASYNC_SQLALCHEMY_ENGINE_OPTIONS", {}))
+        if url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:"):
+            # Reuse connections (and their aiosqlite threads) across requests.
+            options.setdefault("poolclass", AsyncAdaptedQueuePool)
+        self.engine = create_async_engine(url, **options)
+        if self.engine.dialect.name == "sqlite":
+            event.listen(self.engine.sync_engine, "connect", _enable_sqlite_foreign_keys)
+        self.session_factory = async_sessionmaker(self.engine, expire_on_commit=False)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+        with SpooledTemporaryFile(max_size=65536) as body:
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                body.write(message.get("body", b""))
+                if not message.get("more_body"):
+                    break
+            body.seek(0)
+            environ = build_environ(scope, body)
+            if "posts.post_events" in self.views:
+                environ[ASYNC_STREAMS_ENVIRON_KEY] = True
+
+            response = await self._dispatch(environ)
+            if response is not None and hasattr(response.response, "__aiter__"):
+                await self._stream(response, environ, receive, send)
+                return
+            if response is not None:
+                app_iter, status, headers = response.get_wsgi_response(environ)
+                await send({"type": "http.response.start", "status": int(status.split(" ", 1)[0]),
+                            "headers": _headers(headers)})
+                try:
+                    for chunk in app_iter:
+                        if chunk:
+                            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                finally:
+                    if hasattr(app_iter, "close"):
+                        app_iter.close()
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.executor, self._run_wsgi, environ, send, loop)
+
+    async def _dispatch(self, environ):
+        """
+        Runs the async view for a request, if there is one.
+
+        Returns:
+            Response: The response, or None if the request must be handled
+            by the WSGI app.
+        """
+        app = self.app
+        with app.request_context(environ):
+            view = self.views.get(request.endpoint)
+            if view is None or request.method not in view.methods:
+                return None
+            user_id = flask_session.get("_user_id")
+            if user_id is None and request.cookies.get(app.config.get("REMEMBER_COOKIE_NAME", COOKIE_NAME)):
+                # Restoring a session from the remember cookie writes to the
+                # session; leave that to Flask-Login in the WSGI app.
+                return None
+
+            try:
+                try:
+                    async with self.session_factory() as session:
+                        user = await session.get(User, int(user_id)) if user_id is not None else None
+                        g._login_user = user if user is not None else app.login_manager.anonymous_user()
+                        rv = app.preprocess_request()
+                        if rv is None:
+                            rv = await view.func(session, **request.view_args)
+                except Exception as e:
+                    rv = app.handle_user_exception(e)
+                return app.finalize_request(rv)
+            except Exception as e:
+                return app.handle_exception(e)
+
+    async def _stream(self, response, environ, receive, send):
+        """
+        Sends a response whose body is an async iterator, such as an event
+        stream, until the iterator ends or the client disconnects.
+        """
+        body = response.response
+        headers = response.get_wsgi_headers(environ).to_wsgi_list()
+
+        async def pump():
+            await send({"type": "http.response.start", "status": response.status_code,
+                        "headers": _headers(headers)})
+            async for chunk in body:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+
+        async def disconnected():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        streaming = asyncio.ensure_future(pump())
+        watching = asyncio.ensure_future(disconnected())
+        try:
+            done, _ = await asyncio.wait({streaming, watching}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            # Cancelling the pump raises inside the iterator, running its
+            # cleanup (such as unsubscribing) right away.
+            streaming.cancel()
+            watching.cancel()
+            error, _ = await asyncio.gather(streaming, watching, return_exceptions=True)
+            await body.aclose()
+        if watching not in done and isinstance(error, Exception):
+            raise error
+
+    def _run_wsgi(self, environ, send, loop):
+        """
+        Runs the Flask WSGI app in a worker thread, streaming its response.
+        """
+        started = []
+
+        def push(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [int(status.split(" ", 1)[0]), _headers(headers)]
+
+        app_iter = self.app(environ, start_response)
+        try:
+            sent_start = False
+            for chunk in app_iter:
+                if not sent_start:
+                    push({"type": "http.response.start", "status": started[0], "headers": started[1]})
+                    sent_start = True
+                if chunk:
+                    push({"type": "http.response.body", "body": chunk, "more_body": True})
+            if not sent_start:
+                push({"type": "http.response.start", "status": started[0], "headers": started[1]})
+            push({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(app_iter, "close"):
+                app_iter.close()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.engine.dispose()
+                await asyncio.get_running_loop().run_in_executor(self.executor, view_counter.flush)
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def create_asgi_app(app):
+    """
+    Wraps a Flask application for an ASGI server such as uvicorn.
+
+    Args:
+        app (Flask): The application created by `create_app`.
+
+    Returns:
+        AsyncApp: The ASGI application.
+    """
+    return AsyncApp(app)
@@ -0,0 +1,244 @@
+import asyncio
+from collections import namedtuple
+from datetime import datetime
+
+from flask import abort, current_app, flash, jsonify, redirect, render_template, request, url_for
+from flask_login import current_user
+from flask_sqlalchemy.pagination import Pagination
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
+
+from flaskblog import events, limiter, view_counter
+from flaskblog.dbutils import upsert_statement
+from flaskblog.main.utils import tag_cloud_query, archive_months_query
+from flaskblog.models import User, Post, Like, Follow, PostScoreQueue, UserStats
+from flaskblog.posts.forms import CommentForm
+from flaskblog.posts.utils import (comment_page, comment_page_query, comment_page_start, event_stream_response,
+                                   liked_query, post_channel, publish_likes, wants_json)
+
+AsyncView = namedtuple("AsyncView", ["methods", "func"])
+
+views = {}
+
+
+def route(endpoint, methods=("GET", "HEAD")):
+    """
+    Registers an async view for an endpoint of the Flask app.
+
+    The view renders the same template as its synchronous counterpart. It
+    receives an `AsyncSession` as its first argument and must load everything
+    the template touches up front, eager loading relationships, because lazy
+    loads are not possible on an async session.
+
+    Args:
+        endpoint (str): The endpoint name, such as "main.home".
+        methods (tuple): The HTTP methods handled asynchronously; other
+                         methods fall through to the synchronous view.
+    """
+    def decorator(func):
+        view = AsyncView(frozenset(methods), func)
+        views[endpoint] = view
+        return view
+    return decorator
+
+
+class _LoadedPagination(Pagination):
+    """
+    A Flask-SQLAlchemy `Pagination` over items that were already fetched.
+    """
+
+    def _query_items(self):
+        return self._query_args["items"]
+
+    def _query_count(self):
+        return self._query_args["total"]
+
+
+async def paginate(session, query, page, per_page, total=None):
+    """
+    Runs a paginated query on an async session.
+
+    Args:
+        session (AsyncSession): The session.
+        query (Select): The ordered statement selecting the items.
+        page (int): The 1-based page number.
+        per_page (int): The number of items per page.
+        total (int, optional): The known number of items, which saves counting them.
+
+    Returns:
+        Pagination: The page, usable exactly like `Query.paginate()` results.
+    """
+    if page < 1:
+        abort(404)
+    items = (await session.scalars(query.limit(per_page).offset((page - 1) * per_page))).all()
+    if total is None:
+        total = await session.scalar(select(func.count()).select_from(query.order_by(None).subquery()))
+    return _LoadedPagination(page=page, per_page=per_page, items=items, total=total)
+
+
+async def queue_score_refresh(session, post_id):
+    """
+    Async version of `flaskblog.posts.utils.queue_score_refresh`.
+    """
+    row = {"post_id": post_id, "touched_at": datetime.utcnow()}
+    stmt = upsert_statement(PostScoreQueue, session.bind.dialect.name, ["post_id"],
+                            update_columns=["touched_at"])
+    if stmt is None:
+        await session.merge(PostScoreQueue(**row))
+    else:
+        await session.execute(stmt, [row])
+
+
+async def adjust_user_stats(session, user_id, posts=0, likes=0, comments=0):
+    """
+    Async version of `flaskblog.users.utils.adjust_user_stats`.
+    """
+    row = {"user_id": user_id, "post_count": posts, "likes_received": likes, "comments_received": comments}
+    stmt = upsert_statement(UserStats, session.bind.dialect.name, ["user_id"],
+                            increment_columns=["post_count", "likes_received", "comments_received"])
+    if stmt is None:
+        stats = await session.get(UserStats, user_id)
+        if stats is None:
+            session.add(UserStats(**row))
+        else:
+            stats.post_count += posts
+            stats.likes_received += likes
+            stats.comments_received += comments
+    else:
+        await session.execute(stmt, [row])
+
+
+async def toggle_like(session, user_id, post_id):
+    """
+    Async version of `flaskblog.posts.utils.toggle_like`.
+    """
+    removed = (await session.execute(
+        delete(Like).where(Like.user_id == user_id, Like.post_id == post_id)
+    )).rowcount
+    row = (await session.execute(
+        update(Post)
+        .where(Post.id == post_id, Post.deleted_at.is_(None))
+        .values(like_count=Post.like_count + (-1 if removed else 1))
+        .returning(Post.like_count, Post.user_id)
+    )).first()
+    if row is None:
+        return None
+    if not removed:
+        await session.execute(insert(Like).values(user_id=user_id, post_id=post_id))
+    await adjust_user_stats(session, row.user_id, likes=-1 if removed else 1)
+    await queue_score_refresh(session, post_id)
+    return not removed, row.like_count
+
+
+@route("main.home")
+async def home(session):
+    """
+    Renders the home page with a paginated list of blog posts.
+    """
+    page = request.args.get("page", 1, type=int)
+    query = (
+        select(Post)
+        .where(Post.deleted_at.is_(None))
+        .options(joinedload(Post.author))
+        .order_by(Post.date.desc())
+    )
+    posts = await paginate(session, query, page, per_page=5)
+    tags = (await session.scalars(tag_cloud_query())).all()
+    months = (await session.scalars(archive_months_query())).all()
+    return render_template("home.html", posts=posts, tags=tags, months=months)
+
+
+@route("posts.post")
+async def post(session, post_id):
+    """
+    Displays a single post and its comments. New comments are posted through
+    the synchronous view.
+    """
+    post = await session.scalar(
+        select(Post)
+        .where(Post.id == post_id, Post.deleted_at.is_(None))
+        .options(joinedload(Post.author), selectinload(Post.tags))
+    )
+    if post is None:
+        abort(404)
+    view_counter.increment(post.id)
+    form = CommentForm()
+    form.parent_id.data = request.args.get("reply_to", type=int)
+    start = comment_page_start()
+    comments, next_start = comment_page((await session.execute(
+        comment_page_query(post.id, start, current_app.config["COMMENTS_PER_PAGE"])
+    )).all())
+    liked = current_user.is_authenticated and await session.scalar(liked_query(current_user.id, post.id))
+    return render_template("post.html", title=post.title, post=post, form=form, comments=comments,
+                           comments_start=start, next_comments=next_start, liked=liked)
+
+
+@route("users.user_posts")
+async def user_posts(session, username):
+    """
+    Displays all posts by a specific user, counted from their statistics.
+    """
+    page = request.args.get("page", 1, type=int)
+    user = await session.scalar(select(User).where(User.username == username))
+    if user is None:
+        abort(404)
+    stats = await session.get(UserStats, user.id) or UserStats(user_id=user.id, post_count=0, likes_received=0,
+                                                               comments_received=0)
+    query = (
+        select(Post)
+        .where(Post.user_id == user.id, Post.deleted_at.is_(None))
+        .options(joinedload(Post.author))
+        .order_by(Post.date.desc())
+    )
+    posts = await paginate(session, query, page, per_page=5, total=stats.post_count)
+    is_following = (
+        current_user.is_authenticated
+        and await session.get(Follow, (current_user.id, user.id)) is not None
+    )
+    return render_template("user_posts.html", title="Post By " + user.username, posts=posts, user=user,
+                           stats=stats, is_following=is_following)
+
+
+@route("posts.like_post", methods=("POST",))
+async def like_post(session, post_id):
+    """
+    Toggles the like status of a post for the current user.
+    """
+    if not current_user.is_authenticated:
+        return current_app.login_manager.unauthorized()
+    # Rate limit backends may do blocking I/O.
+    await asyncio.to_thread(limiter.check, "posts.like_post")
+
+    try:
+        result = await toggle_like(session, current_user.id, post_id)
+    except IntegrityError:
+        await session.rollback()
+        result = await toggle_like(session, current_user.id, post_id)
+    if result is None:
+        await session.rollback()
+        abort(404)
+    await session.commit()
+
+    liked, like_count = result
+    # Event backends may do blocking I/O.
+    await asyncio.to_thread(publish_likes, post_id, like_count)
+    if wants_json():
+        return jsonify(liked=liked, likes=like_count)
+    if liked:
+        flash('You liked the post!', 'success')
+    else:
+        flash('You disliked the post.', 'info')
+    return redirect(url_for('posts.post', post_id=post_id))
+
+
+@route("posts.post_events")
+async def post_events(session, post_id):
+    """
+    Streams live updates of a post as Server-Sent Events. Idle streams wait
+    on the event loop rather than in a thread.
+    """
+    if await session.scalar(select(Post.id).where(Post.id == post_id, Post.deleted_at.is_(None))) is None:
+        abort(404)
+    last_event_id = request.headers.get("Last-Event-ID", type=int)
+    return event_stream_response(events.astream(post_channel(post_id), last_event_id))
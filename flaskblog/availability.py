@@ -0,0 +1,183 @@
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = logging.getLogger(__name__)
+
+# Fields of `User` whose values are indexed, each backed by a unique constraint.
+FIELDS = ("username", "email")
+
+
+class BloomFilter:
+    """
+    A fixed-size set that answers "definitely absent" or "maybe present".
+
+    Sized for `capacity` keys at the given false positive rate. Keys are
+    hashed once with BLAKE2b and the bit positions derived by double hashing.
+    Keys can be added but not removed.
+    """
+
+    def __init__(self, capacity, false_positive_rate=0.01):
+        capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class AvailabilityIndex:
+    """
+    Keeps an in-memory Bloom filter of the usernames and emails in use, so
+    most availability checks never reach the database.
+
+    A value the filter has never seen is free; a value it may have seen is
+    looked up by the caller. Each process rebuilds its filter from the user
+    table in a background thread every `AVAILABILITY_REBUILD_INTERVAL`
+    seconds, and adds the values it writes itself right away. A value taken
+    through another process can therefore look free for up to one interval;
+    the unique constraints have the final say when the account is saved.
+    Until the first build finishes every value is reported as maybe taken.
+    """
+
+    def __init__(self, app=None, db=None):
+        self.app = None
+        self.db = None
+        self._filter = None
+        self._added = []
+        self._lock = threading.Lock()
+        self._pid = None
+        self._hooks_registered = False
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        """
+        Binds the index to an application.
+
+        Args:
+            app (Flask): The application whose users are indexed.
+            db (SQLAlchemy): The database extension instance.
+        """
+        app.config.setdefault("AVAILABILITY_REBUILD_INTERVAL", 300)
+        app.config.setdefault("AVAILABILITY_FALSE_POSITIVE_RATE", 0.01)
+        app.extensions["availability"] = self
+        self.app = app
+        self.db = db
+        if self._hooks_registered:
+            # The index outlives apps created again with create_app().
+            return
+        self._hooks_registered = True
+        if hasattr(os, "register_at_fork"):
+            # Each process builds and refreshes its own filter.
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        self._lock = threading.Lock()
+        self._filter = None
+        self._added = []
+        self._pid = None
+
+    def _ensure_rebuilder(self):
+        """
+        Starts the periodic rebuild thread once per process.
+        """
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        thread = threading.Thread(target=self._run, name="availability-rebuild", daemon=True)
+        thread.start()
+
+    def _run(self):
+        interval = self.app.config["AVAILABILITY_REBUILD_INTERVAL"]
+        while True:
+            try:
+                self.rebuild()
+            except SQLAlchemyError:
+                logger.exception("Could not rebuild the username and email filter; will retry")
+            time.sleep(interval)
+
+    def rebuild(self):
+        """
+        Builds a fresh filter from the user table and swaps it in.
+
+        Values added while the table is being read are carried over, so a
+        write made during the rebuild is not lost.
+
+        Returns:
+            int: The number of users indexed.
+        """
+        from flaskblog.models import User
+
+        with self._lock:
+            self._added = []
+        with self.app.app_context():
+            session = self.db.session
+            count = session.scalar(select(func.count()).select_from(User))
+            # Room to grow before the next rebuild without losing accuracy.
+            bloom = BloomFilter(2 * count + 1024, self.app.config["AVAILABILITY_FALSE_POSITIVE_RATE"])
+            rows = session.execute(select(User.username, User.email).execution_options(yield_per=5000))
+            for username, email in rows:
+                bloom.add(_key("username", username))
+                bloom.add(_key("email", email))
+        with self._lock:
+            for key in self._added:
+                bloom.add(key)
+            self._added = []
+            self._filter = bloom
+        return count
+
+    def add(self, **values):
+        """
+        Records values this process has just saved, such as a new username.
+
+        Args:
+            **values: Field names from `FIELDS` mapped to their new values.
+        """
+        keys = [_key(field, value) for field, value in values.items()]
+        with self._lock:
+            if self._pid != os.getpid():
+                # No filter is being built in this process yet.
+                return
+            if self._filter is not None:
+                for key in keys:
+                    self._filter.add(key)
+            self._added.extend(keys)
+
+    def might_be_taken(self, field, value):
+        """
+        Tells whether a value may be in use.
+
+        Args:
+            field (str): "username" or "email".
+            value (str): The value to check.
+
+        Returns:
+            bool: False if the value is certainly free, True if it has to be
+                  looked up.
+        """
+        self._ensure_rebuilder()
+        bloom = self._filter
+        return bloom is None or _key(field, value) in bloom
+
+
+def _key(field, value):
+    return f"{field}:{value}"
@@ -19,6 +19,94 @@ class Config:
         MAIL_USE_TLS (bool): A boolean indicating whether to use TLS.
         MAIL_USERNAME (str): The username for the email account.
         MAIL_PASSWORD (str): The password for the email account.
+        TRENDING_HALF_LIFE (int): Seconds after which a post's engagement counts
+                                  half as much in the popular feed.
+        TRENDING_LIKE_WEIGHT (float): The weight of a like in the trending score.
+        TRENDING_COMMENT_WEIGHT (float): The weight of a comment in the trending score.
+        POST_SOFT_DELETE (bool): When True, deleting a post only hides it and
+                                 `flask posts purge-deleted` removes it and its
+                                 children later in bounded batches.
+        COMMENTS_PER_PAGE (int): Top-level comments, with their replies, shown per
+                                 page of a post.
+        FEED_FANOUT_LIMIT (int): Authors with more followers than this are merged
+                                 into timelines on read instead of pushed on write.
+        FEED_BACKFILL (int): Number of recent posts copied into a timeline when
+                             following an author, and into every follower's
+                             timeline when the author drops back to
+                             `FEED_FANOUT_LIMIT` followers.
+        SITE_URL (str): The public base URL used for absolute links in feeds and
+                        sitemaps. Defaults to the host of the request that
+                        rebuilds them; required by `flask posts rebuild-feeds`.
+        FEED_SIZE (int): The number of newest posts listed in each Atom feed.
+        SITEMAP_SHARD_SIZE (int): The range of post IDs listed by one sitemap shard.
+        RATELIMIT_STORAGE_URL (str): Where token buckets are kept: "memory://" (per
+                                     process), "sqlite:///ratelimit.db" (shared by
+                                     the processes on one host, relative to the
+                                     instance folder) or "redis://host:port/db"
+                                     (shared by every node).
+        RATELIMITS (dict): Per-endpoint token bucket limits, keyed by endpoint
+                           name, with optional "ip" and "user" limits such as
+                           "10/minute" and the limited "methods" (POST by default).
+        MEDIA_STORAGE (str): Where uploaded media is stored: "local" (the static
+                             folder) or "s3" (an S3-compatible object store,
+                             which requires `pip install boto3`).
+        MEDIA_URL (str): Optional public base URL (for example a CDN) media is
+                         served from instead of the app or presigned URLs.
+        S3_BUCKET (str): The bucket used when `MEDIA_STORAGE` is "s3".
+        S3_ENDPOINT_URL (str): Optional endpoint of an S3-compatible server.
+        S3_REGION (str): Optional region of the bucket.
+        S3_URL_EXPIRY (int): Lifetime in seconds of presigned media URLs.
+        VIEW_COUNT_FLUSH_INTERVAL (int): Seconds between flushes of buffered post views.
+        VIEW_COUNT_FLUSH_THRESHOLD (int): Number of buffered post views that
+                                          triggers an immediate flush.
+        ASYNC_SQLALCHEMY_DATABASE_URI (str): Optional database URI for the async
+                                             handlers of the ASGI app. Derived from
+                                             `SQLALCHEMY_DATABASE_URI` by default
+                                             (aiosqlite for SQLite, asyncpg for
+                                             PostgreSQL).
+        ASGI_THREADS (int): Size of the thread pool that runs the synchronous
+                            views when the app is served over ASGI.
+        EVENTS_BACKEND_URL (str): How live post events reach subscribers:
+                                  "memory://" (within one process) or
+                                  "redis://host:port/db" (across every process).
+        EVENTS_HEARTBEAT (int): Seconds between keep-alive comments on idle event streams.
+        EVENTS_CLIENT_BUFFER (int): Events queued for one client before its stream
+                                    is closed so it reconnects and catches up.
+        EVENTS_HISTORY (int): Recent events kept per post for resuming streams.
+        EVENTS_STREAM_TIMEOUT (int): Seconds after which an event stream ends and
+                                     the browser reconnects.
+        READ_ONLY_FLAG (str): The file, relative to the instance folder, whose
+                              presence switches the site to read-only mode.
+        READ_ONLY_RETRY_AFTER (int): The `Retry-After` seconds sent with 503
+                                     responses while read-only mode is switched on.
+        CIRCUIT_BREAKER_THRESHOLD (int): Database errors within
+                                         `CIRCUIT_BREAKER_WINDOW` seconds that
+                                         switch a worker to read-only mode.
+        CIRCUIT_BREAKER_WINDOW (int): Seconds over which database errors are counted.
+        CIRCUIT_BREAKER_COOLDOWN (int): Seconds a tripped worker stays read-only
+                                        before one request probes the database.
+        SNAPSHOT_DIR (str): The folder, relative to the instance folder, holding the
+                            page snapshots served while read-only.
+        SNAPSHOT_ENDPOINTS (tuple): The endpoints answered from snapshots for
+                                    anonymous visitors while read-only.
+        SNAPSHOT_HOME_PAGES (int): Home pages rendered by `flask read-only snapshot`.
+        SNAPSHOT_POSTS (int): Newest posts, with their authors' pages, rendered by
+                              `flask read-only snapshot`.
+        AVAILABILITY_REBUILD_INTERVAL (int): Seconds between rebuilds of each
+                                             worker's in-memory filter of the
+                                             usernames and emails in use.
+        AVAILABILITY_FALSE_POSITIVE_RATE (float): Share of free values the filter
+                                                  reports as maybe taken, which
+                                                  are then looked up.
+        SERVE_WORKERS (int): Worker processes started by `flask serve`.
+        SERVE_MAX_REQUESTS (int): Requests after which a `flask serve` worker is
+                                  replaced (0 disables recycling).
+        SERVE_MAX_REQUESTS_JITTER (int): Random extra requests per worker, so
+                                         workers are not all replaced at once.
+        SERVE_MAX_RSS_MB (int): Resident memory in MiB above which a worker is
+                                replaced (0 disables the limit).
+        SERVE_GRACEFUL_TIMEOUT (int): Seconds workers get to finish their
+                                      current request on shutdown.
     """
     SECRET_KEY = os.environ.get("SECRET_KEY")
     SQLALCHEMY_DATABASE_URI = os.environ.get("SQLALCHEMY_DATABASE_URI")
@@ -26,4 +114,53 @@ class Config:
     MAIL_PORT = 587
     MAIL_USE_TLS = True
     MAIL_USERNAME = os.environ.get("EMAIL_USERNAME")
-    MAIL_PASSWORD = os.environ.get("EMAIL_PASSWORD")
\ No newline at end of file
+    MAIL_PASSWORD = os.environ.get("EMAIL_PASSWORD")
+    TRENDING_HALF_LIFE = 24 * 60 * 60
+    TRENDING_LIKE_WEIGHT = 1.0
+    TRENDING_COMMENT_WEIGHT = 2.0
+    POST_SOFT_DELETE = False
+    COMMENTS_PER_PAGE = 20
+    FEED_FANOUT_LIMIT = 1000
+    FEED_BACKFILL = 20
+    SITE_URL = os.environ.get("SITE_URL")
+    FEED_SIZE = 20
+    SITEMAP_SHARD_SIZE = 5000
+    VIEW_COUNT_FLUSH_INTERVAL = 10
+    VIEW_COUNT_FLUSH_THRESHOLD = 500
+    RATELIMIT_STORAGE_URL = os.environ.get("RATELIMIT_STORAGE_URL", "memory://")
+    RATELIMITS = {
+        "users.login": {"ip": "10/minute"},
+        "users.reset_request": {"ip": "5/hour"},
+        "posts.like_post": {"ip": "120/minute", "user": "60/minute"},
+        "posts.post": {"ip": "30/minute", "user": "10/minute"},
+        "users.availability_check": {"ip": "60/minute", "methods": ("GET",)},
+    }
+    MEDIA_STORAGE = os.environ.get("MEDIA_STORAGE", "local")
+    MEDIA_URL = os.environ.get("MEDIA_URL")
+    S3_BUCKET = os.environ.get("S3_BUCKET")
+    S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL")
+    S3_REGION = os.environ.get("S3_REGION")
+    S3_URL_EXPIRY = 3600
+    ASYNC_SQLALCHEMY_DATABASE_URI = os.environ.get("ASYNC_SQLALCHEMY_DATABASE_URI")
+    ASGI_THREADS = 32
+    EVENTS_BACKEND_URL = os.environ.get("EVENTS_BACKEND_URL", "memory://")
+    EVENTS_HEARTBEAT = 15
+    EVENTS_CLIENT_BUFFER = 64
+    EVENTS_HISTORY = 100
+    EVENTS_STREAM_TIMEOUT = 300
+    READ_ONLY_FLAG = "read_only"
+    READ_ONLY_RETRY_AFTER = 60
+    CIRCUIT_BREAKER_THRESHOLD = 5
+    CIRCUIT_BREAKER_WINDOW = 10
+    CIRCUIT_BREAKER_COOLDOWN = 30
+    SNAPSHOT_DIR = "snapshots"
+    SNAPSHOT_ENDPOINTS = ("main.home", "posts.post", "users.user_posts")
+    SNAPSHOT_HOME_PAGES = 5
+    SNAPSHOT_POSTS = 200
+    AVAILABILITY_REBUILD_INTERVAL = 300
+    AVAILABILITY_FALSE_POSITIVE_RATE = 0.01
+    SERVE_WORKERS = 2 * (os.cpu_count() or 1) + 1
+    SERVE_MAX_REQUESTS = 10000
+    SERVE_MAX_REQUESTS_JITTER = 500
+    SERVE_MAX_RSS_MB = 512
+    SERVE_GRACEFUL_TIMEOUT = 30
@@ -0,0 +1,144 @@
+import atexit
+import logging
+import os
+import threading
+from collections import Counter
+
+from sqlalchemy import bindparam
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    """
+    Aggregates post view increments in memory and writes them in batches.
+
+    Recording a view only bumps an in-process counter. Pending increments are
+    flushed with one batched `UPDATE post SET views = views + :n` by a
+    background thread when `VIEW_COUNT_FLUSH_THRESHOLD` views have
+    accumulated and every `VIEW_COUNT_FLUSH_INTERVAL` seconds, and when the
+    process exits, so requests never wait for the write. Because
+    every worker process only ever adds its own increments, counts from many
+    processes merge correctly in the database without coordination.
+    """
+
+    def __init__(self, app=None, db=None):
+        self.app = None
+        self.db = None
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._pending_total = 0
+        self._pid = None
+        self._wake = threading.Event()
+        self._hooks_registered = False
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        """
+        Binds the counter to an application and registers the shutdown flush.
+
+        Args:
+            app (Flask): The application whose database receives the counts.
+            db (SQLAlchemy): The database extension instance.
+        """
+        app.config.setdefault("VIEW_COUNT_FLUSH_INTERVAL", 10)
+        app.config.setdefault("VIEW_COUNT_FLUSH_THRESHOLD", 500)
+        app.extensions["view_counter"] = self
+        app.add_template_global(self.count, "view_count")
+        self.app = app
+        self.db = db
+        if self._hooks_registered:
+            # The counter outlives apps created again with create_app().
+            return
+        self._hooks_registered = True
+        atexit.register(self.flush)
+        if hasattr(os, "register_at_fork"):
+            # Increments recorded before a fork belong to the parent only.
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._pending_total = 0
+        self._pid = None
+        self._wake = threading.Event()
+
+    def _ensure_flusher(self):
+        """
+        Starts the periodic flush thread once per process.
+        """
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        thread = threading.Thread(target=self._run, name="view-counter-flush", daemon=True)
+        thread.start()
+
+    def _run(self):
+        interval = self.app.config["VIEW_COUNT_FLUSH_INTERVAL"]
+        while True:
+            self._wake.wait(interval)
+            self._wake.clear()
+            self.flush()
+
+    def increment(self, post_id):
+        """
+        Records one view of a post.
+
+        Args:
+            post_id (int): The ID of the viewed post.
+        """
+        with self._lock:
+            self._ensure_flusher()
+            self._pending[post_id] += 1
+            self._pending_total += 1
+            if self._pending_total >= self.app.config["VIEW_COUNT_FLUSH_THRESHOLD"]:
+                self._wake.set()
+
+    def count(self, post):
+        """
+        Returns the view count of a post including this process's pending views.
+
+        This reads the already-loaded `views` column and the in-memory
+        counter, so showing counts never costs an extra query.
+
+        Args:
+            post (Post): The post to count.
+
+        Returns:
+            int: The number of views.
+        """
+        return (post.views or 0) + self._pending.get(post.id, 0)
+
+    def flush(self):
+        """
+        Writes all pending increments to the database in one batched UPDATE.
+
+        If the write fails the increments are put back and retried on the
+        next flush.
+        """
+        with self._lock:
+            batch, self._pending = self._pending, Counter()
+            self._pending_total = 0
+        if not batch or self.app is None:
+            return
+
+        from flaskblog.models import Post
+
+        table = Post.__table__
+        stmt = (
+            table.update()
+            .where(table.c.id == bindparam("post_id"))
+            .values(views=table.c.views + bindparam("increment"))
+        )
+        rows = [{"post_id": post_id, "increment": n} for post_id, n in batch.items()]
+        try:
+            with self.app.app_context():
+                with self.db.engine.begin() as connection:
+                    connection.execute(stmt, rows)
+        except SQLAlchemyError:
+            logger.exception("Could not flush %d post view count(s); will retry", len(rows))
+            with self._lock:
+                self._pending.update(batch)
+                self._pending_total += sum(batch.values())
@@ -0,0 +1,109 @@
+import base64
+import binascii
+import json
+
+from sqlalchemy.dialects import postgresql, sqlite
+from flaskblog import db
+
+
+_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+
+def upsert_statement(model, dialect_name, index_elements, update_columns=(), increment_columns=()):
+    """
+    Builds the `INSERT ... ON CONFLICT` statement used by `upsert`.
+
+    Args:
+        model: The model class to write to.
+        dialect_name (str): The name of the database dialect, such as "sqlite".
+        index_elements (list): The key columns used to detect conflicts.
+        update_columns (iterable): Columns overwritten with the new value.
+        increment_columns (iterable): Columns incremented by the new value.
+
+    Returns:
+        Insert: The statement, or None if the dialect has no upsert syntax.
+    """
+    insert = _INSERTS.get(dialect_name)
+    if insert is None:
+        return None
+
+    table = model.__table__
+    stmt = insert(table)
+    set_ = {column: stmt.excluded[column] for column in update_columns}
+    set_.update({column: table.c[column] + stmt.excluded[column] for column in increment_columns})
+    if set_:
+        return stmt.on_conflict_do_update(index_elements=index_elements, set_=set_)
+    return stmt.on_conflict_do_nothing(index_elements=index_elements)
+
+
+def upsert(model, rows, index_elements, update_columns=(), increment_columns=()):
+    """
+    Inserts rows, updating the existing row when the key already exists.
+
+    The statement is a single `INSERT ... ON CONFLICT DO UPDATE` executed for
+    all rows at once. On backends without that syntax each row is merged
+    through the session instead.
+
+    Args:
+        model: The model class to write to.
+        rows (list): Dicts of column values, one per row.
+        index_elements (list): The key columns used to detect conflicts.
+        update_columns (iterable): Columns overwritten with the new value.
+        increment_columns (iterable): Columns incremented by the new value.
+    """
+    if not rows:
+        return
+
+    stmt = upsert_statement(model, db.session.get_bind().dialect.name, index_elements,
+                            update_columns, increment_columns)
+    if stmt is None:
+        for row in rows:
+            existing = db.session.get(model, tuple(row[key] for key in index_elements))
+            if existing is None:
+                db.session.add(model(**row))
+                continue
+            for column in update_columns:
+                setattr(existing, column, row[column])
+            for column in increment_columns:
+                setattr(existing, column, getattr(existing, column) + row[column])
+        db.session.flush()
+        return
+    db.session.execute(stmt, rows)
+
+
+def encode_cursor(*values):
+    """
+    Encodes the sort key of the last row on a page into an opaque cursor.
+
+    Args:
+        *values: JSON-serializable sort key values.
+
+    Returns:
+        str: A URL-safe cursor string.
+    """
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, size):
+    """
+    Decodes a cursor produced by `encode_cursor`.
+
+    Args:
+        cursor (str): The cursor from the request, or None.
+        size (int): The number of values the cursor must contain.
+
+    Returns:
+        list: The decoded values, or None if the cursor is missing or malformed.
+    """
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
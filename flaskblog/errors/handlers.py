@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template
+from flask import Blueprint, current_app, render_template, make_response
 
 errors = Blueprint("errors", __name__)
 
@@ -51,4 +51,46 @@ def error_500(error):
     Returns:
         A tuple containing the rendered 500 template and the 500 status code.
     """
-    return render_template("errors/500.html"), 500
\ No newline at end of file
+    return render_template("errors/500.html"), 500
+
+
+
+@errors.app_errorhandler(429)
+def error_429(error):
+    """
+    Handles 429 Too Many Requests errors raised by the rate limiter.
+
+    Renders a custom 429 error page and passes on the `Retry-After` header.
+
+    Args:
+        error: The error object.
+
+    Returns:
+        A response with the rendered 429 template and the 429 status code.
+    """
+    response = make_response(render_template("errors/429.html"), 429)
+    if getattr(error, "retry_after", None):
+        response.headers["Retry-After"] = str(error.retry_after)
+    return response
+
+
+
+@errors.app_errorhandler(503)
+def error_503(error):
+    """
+    Handles 503 Service Unavailable errors raised while the site is read-only.
+
+    Renders a standalone 503 page without the regular layout or context
+    processors, which would load the current user from the database, and
+    passes on the `Retry-After` header.
+
+    Args:
+        error: The error object.
+
+    Returns:
+        A response with the rendered 503 template and the 503 status code.
+    """
+    response = make_response(current_app.jinja_env.get_template("errors/503.html").render(), 503)
+    if getattr(error, "retry_after", None):
+        response.headers["Retry-After"] = str(error.retry_after)
+    return response
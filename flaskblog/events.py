@@ -0,0 +1,399 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from urllib.parse import urlparse
+
+from flask import request
+
+logger = logging.getLogger(__name__)
+
+# Set by the ASGI app on requests it serves, when it streams events from an
+# async view that holds no worker.
+ASYNC_STREAMS_ENVIRON_KEY = "flaskblog.async_streams"
+
+Event = namedtuple("Event", ["id", "type", "data"])
+
+
+def format_event(event):
+    """
+    Formats an event as a Server-Sent Events message.
+
+    Args:
+        event (Event): The event; `data` must be JSON-serializable.
+
+    Returns:
+        str: The message, terminated by a blank line.
+    """
+    return f"id: {event.id}\nevent: {event.type}\ndata: {json.dumps(event.data)}\n\n"
+
+
+class Subscription:
+    """
+    One client's subscription to a channel.
+
+    Events are queued until the client's stream picks them up. The queue is
+    bounded: once `maxsize` events are waiting the subscription is marked
+    `overflowed` and receives nothing more, and the stream ends so the client
+    reconnects and catches up from the channel history.
+    """
+
+    def __init__(self, channel, maxsize, loop=None):
+        self.channel = channel
+        self.maxsize = maxsize
+        self.overflowed = False
+        self._loop = loop
+        self._events = deque()
+        self._lock = threading.Lock()
+        self._ready = asyncio.Event() if loop is not None else threading.Event()
+
+    def put(self, event):
+        """
+        Queues an event; safe to call from any thread.
+        """
+        with self._lock:
+            if self.overflowed:
+                return
+            if len(self._events) >= self.maxsize:
+                self.overflowed = True
+            else:
+                self._events.append(event)
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        else:
+            self._ready.set()
+
+    def _drain(self):
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+            self._ready.clear()
+        return events
+
+    def get(self, timeout):
+        """
+        Waits up to `timeout` seconds for events.
+
+        Returns:
+            list: The queued events, possibly empty.
+        """
+        self._ready.wait(timeout)
+        return self._drain()
+
+    async def get_async(self, timeout):
+        """
+        Async version of `get` for subscriptions created on an event loop.
+        """
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._drain()
+
+
+class MemoryEventBackend:
+    """
+    Delivers events within the current process only.
+
+    Each channel keeps its most recent events for resuming streams; the
+    least recently used channels are forgotten once `max_channels` is reached.
+    """
+
+    def __init__(self, history=100, max_channels=10000):
+        self.history = history
+        self.max_channels = max_channels
+        self._channels = OrderedDict()
+        self._lock = threading.Lock()
+        self.deliver = None
+
+    def _channel(self, channel):
+        state = self._channels.pop(channel, None)
+        if state is None:
+            state = {"last_id": 0, "events": deque(maxlen=self.history)}
+        self._channels[channel] = state
+        if len(self._channels) > self.max_channels:
+            self._channels.popitem(last=False)
+        return state
+
+    def publish(self, channel, type, data):
+        with self._lock:
+            state = self._channel(channel)
+            state["last_id"] += 1
+            event = Event(state["last_id"], type, data)
+            state["events"].append(event)
+        self.deliver(channel, event)
+
+    def history_since(self, channel, last_id):
+        with self._lock:
+            state = self._channels.get(channel)
+            return list(state["events"]) if state else []
+
+    def start(self):
+        pass
+
+
+class RedisEventBackend:
+    """
+    Delivers events to every process through Redis pub/sub. Requires the
+    `redis` package.
+
+    Publishing is one script call that numbers the event, appends it to the
+    channel's capped history list and publishes it. Each process runs one
+    listener thread, subscribed to all channels, that hands received events
+    to the local hub.
+    """
+
+    SCRIPT = """
+    local id = redis.call('INCR', KEYS[1])
+    local message = id .. '\\n' .. ARGV[1] .. '\\n' .. ARGV[2]
+    redis.call('LPUSH', KEYS[2], message)
+    redis.call('LTRIM', KEYS[2], 0, tonumber(ARGV[3]) - 1)
+    redis.call('EXPIRE', KEYS[1], ARGV[4])
+    redis.call('EXPIRE', KEYS[2], ARGV[4])
+    redis.call('PUBLISH', KEYS[3], message)
+    return id
+    """
+
+    def __init__(self, url, history=100, ttl=86400):
+        import redis
+
+        self.history = history
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+        self._pid = None
+        self._lock = threading.Lock()
+        self.deliver = None
+
+    @staticmethod
+    def _parse(message):
+        id, type, data = message.decode().split("\n", 2)
+        return Event(int(id), type, json.loads(data))
+
+    def publish(self, channel, type, data):
+        keys = [f"events:{channel}:id", f"events:{channel}:history", f"events:{channel}"]
+        self._script(keys=keys, args=[type, json.dumps(data), self.history, self.ttl])
+
+    def history_since(self, channel, last_id):
+        messages = self._client.lrange(f"events:{channel}:history", 0, -1)
+        return [self._parse(message) for message in reversed(messages)]
+
+    def start(self):
+        """
+        Starts the listener thread once per process.
+        """
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        thread = threading.Thread(target=self._listen, name="event-listener", daemon=True)
+        thread.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe("events:*")
+                for message in pubsub.listen():
+                    if message["type"] == "pmessage":
+                        channel = message["channel"].decode()[len("events:"):]
+                        self.deliver(channel, self._parse(message["data"]))
+            except Exception:
+                logger.exception("Event listener lost its Redis connection; reconnecting")
+                time.sleep(1)
+
+
+def create_backend(url, history=100):
+    """
+    Creates an event backend from a URL.
+
+    Args:
+        url (str): "memory://" or "redis://host:port/db".
+        history (int): The number of recent events kept per channel.
+
+    Returns:
+        object: A backend with `publish`, `history_since` and `start` methods.
+    """
+    scheme = urlparse(url).scheme
+    if scheme == "memory":
+        return MemoryEventBackend(history)
+    if scheme in ("redis", "rediss", "unix"):
+        return RedisEventBackend(url, history)
+    raise ValueError(f"Unsupported EVENTS_BACKEND_URL: {url}")
+
+
+class EventHub:
+    """
+    Publish/subscribe hub for live page updates over Server-Sent Events.
+
+    Views publish events to named channels (such as "post:42") and clients
+    subscribe through `stream` (in a worker thread) or `astream` (on an event
+    loop, holding no thread while idle). Streams send a comment line every
+    `EVENTS_HEARTBEAT` seconds to keep connections open and notice clients
+    that went away, and end after `EVENTS_STREAM_TIMEOUT` seconds so that no
+    connection is held forever; browsers reconnect and resume on their own.
+
+    Event IDs increase per channel. A client reconnecting with the ID of the
+    last event it saw (the `Last-Event-ID` header) first receives the events
+    it missed from the channel history; if some are no longer in the history,
+    or the ID is newer than anything in the channel, it gets a "reset" event
+    instead, telling it to reload.
+
+    `EVENTS_BACKEND_URL` selects where events travel: "memory://" (the
+    current process only) or "redis://host:port/db" (every process).
+
+    Pages only subscribe when served through the ASGI app: under a WSGI
+    server each open stream would hold a whole worker for up to
+    `EVENTS_STREAM_TIMEOUT` seconds.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.heartbeat = 15
+        self.buffer = 64
+        self.timeout = 300
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Configures the hub's backend for an application.
+
+        Args:
+            app (Flask): The application.
+        """
+        config = app.config
+        config.setdefault("EVENTS_BACKEND_URL", "memory://")
+        config.setdefault("EVENTS_HEARTBEAT", 15)
+        config.setdefault("EVENTS_CLIENT_BUFFER", 64)
+        config.setdefault("EVENTS_HISTORY", 100)
+        config.setdefault("EVENTS_STREAM_TIMEOUT", 300)
+        self.heartbeat = config["EVENTS_HEARTBEAT"]
+        self.buffer = config["EVENTS_CLIENT_BUFFER"]
+        self.timeout = config["EVENTS_STREAM_TIMEOUT"]
+        self.backend = create_backend(config["EVENTS_BACKEND_URL"], config["EVENTS_HISTORY"])
+        self.backend.deliver = self._deliver
+        app.extensions["events"] = self
+        app.add_template_global(self.streams_available, "live_events_available")
+
+    def streams_available(self):
+        """
+        Tells whether the current request is served by the ASGI app, which
+        streams events without tying up a worker.
+        """
+        return bool(request.environ.get(ASYNC_STREAMS_ENVIRON_KEY))
+
+    def publish(self, channel, type, data):
+        """
+        Publishes an event to every subscriber of a channel.
+
+        Args:
+            channel (str): The channel name.
+            type (str): The event type, used as the SSE event name.
+            data: JSON-serializable event data.
+        """
+        self.backend.publish(channel, type, data)
+
+    def _deliver(self, channel, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.put(event)
+
+    def subscribe(self, channel, loop=None):
+        """
+        Subscribes to a channel.
+
+        Args:
+            channel (str): The channel name.
+            loop: The event loop of an async consumer, or None.
+
+        Returns:
+            Subscription: The new subscription.
+        """
+        self.backend.start()
+        subscription = Subscription(channel, self.buffer, loop)
+        with self._lock:
+            self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.channel]
+
+    def _missed(self, channel, last_event_id):
+        """
+        Returns the messages that resume a stream after `last_event_id`.
+        """
+        if last_event_id is None:
+            return []
+        history = self.backend.history_since(channel, last_event_id)
+        newest = history[-1].id if history else 0
+        if last_event_id > newest:
+            # The client is ahead of the channel: its IDs come from a numbering
+            # that was lost (a restart, an evicted channel, another process
+            # with the memory backend, or an expired Redis key).
+            return [Event(newest, "reset", {})]
+        missed = [event for event in history if event.id > last_event_id]
+        if missed and missed[0].id > last_event_id + 1:
+            return [Event(missed[-1].id, "reset", {})]
+        return missed
+
+    def _messages(self, events, last_sent):
+        messages = []
+        for event in events:
+            # Resumed events may also arrive live; send each ID once. A reset
+            # may carry a lower ID than the client's and restarts the count.
+            if event.id > last_sent or event.type == "reset":
+                messages.append(format_event(event))
+                last_sent = event.id
+        return messages, last_sent
+
+    def stream(self, channel, last_event_id=None):
+        """
+        Streams a channel's events as SSE messages, blocking between events.
+
+        Args:
+            channel (str): The channel name.
+            last_event_id (int): The last event ID the client has seen.
+
+        Yields:
+            str: SSE messages and heartbeat comments.
+        """
+        subscription = self.subscribe(channel)
+        try:
+            messages, last_sent = self._messages(self._missed(channel, last_event_id), last_event_id or 0)
+            yield "".join([f"retry: 3000\n: {channel}\n\n", *messages])
+            deadline = time.monotonic() + self.timeout
+            while not subscription.overflowed and time.monotonic() < deadline:
+                events = subscription.get(min(self.heartbeat, deadline - time.monotonic()))
+                messages, last_sent = self._messages(events, last_sent)
+                yield "".join(messages) if messages else ": heartbeat\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+    async def astream(self, channel, last_event_id=None):
+        """
+        Async version of `stream`; idle subscribers hold no thread.
+        """
+        subscription = self.subscribe(channel, asyncio.get_running_loop())
+        try:
+            missed = await asyncio.to_thread(self._missed, channel, last_event_id)
+            messages, last_sent = self._messages(missed, last_event_id or 0)
+            yield "".join([f"retry: 3000\n: {channel}\n\n", *messages])
+            deadline = time.monotonic() + self.timeout
+            while not subscription.overflowed and time.monotonic() < deadline:
+                events = await subscription.get_async(min(self.heartbeat, deadline - time.monotonic()))
+                messages, last_sent = self._messages(events, last_sent)
+                yield "".join(messages) if messages else ": heartbeat\n\n"
+        finally:
+            self.unsubscribe(subscription)
@@ -0,0 +1,82 @@
+from flask import Blueprint, Response, abort, request
+from sqlalchemy import func, select
+
+from flaskblog import db
+from flaskblog.feeds.utils import (SITE_FEED_KEY, SITEMAP_INDEX_KEY, user_feed_key, sitemap_key, post_shard,
+                                   build_site_feed, build_user_feed, build_sitemap_shard, build_sitemap_index,
+                                   store_artifact, is_stale)
+from flaskblog.models import User, Post, FeedArtifact
+
+feeds = Blueprint("feeds", __name__)
+
+
+def artifact_response(key, build, mimetype):
+    """
+    Serves a stored artifact with its ETag and Last-Modified date, answering
+    conditional requests with 304 Not Modified.
+
+    An artifact that was never built (for example a shard of posts created
+    before feeds existed) or was marked stale by a post change is built and
+    stored on its first request.
+
+    Args:
+        key (str): The artifact key.
+        build (callable): Builds the artifact body if it is missing.
+        mimetype (str): The response content type.
+
+    Returns:
+        Response: The artifact, or an empty 304 response.
+    """
+    artifact = db.session.get(FeedArtifact, key)
+    if artifact is None or is_stale(artifact):
+        artifact = store_artifact(key, build)
+        db.session.commit()
+    response = Response(artifact.body, mimetype=mimetype)
+    response.set_etag(artifact.etag)
+    response.last_modified = artifact.updated_at
+    response.cache_control.public = True
+    response.cache_control.max_age = 300
+    return response.make_conditional(request)
+
+
+@feeds.route("/feed.xml")
+def site_feed():
+    """
+    Serves the Atom feed of the newest posts.
+    """
+    return artifact_response(SITE_FEED_KEY, build_site_feed, "application/atom+xml")
+
+
+@feeds.route("/user/<string:username>/feed.xml")
+def user_feed(username):
+    """
+    Serves the Atom feed of a user's newest posts.
+
+    Args:
+        username (str): The author's username.
+    """
+    user = User.query.filter_by(username=username).first_or_404()
+    return artifact_response(user_feed_key(user.id), lambda: build_user_feed(user), "application/atom+xml")
+
+
+@feeds.route("/sitemap.xml")
+def sitemap_index():
+    """
+    Serves the sitemap index, which lists the sitemap shards.
+    """
+    return artifact_response(SITEMAP_INDEX_KEY, build_sitemap_index, "application/xml")
+
+
+@feeds.route("/sitemap-<int:shard>.xml")
+def sitemap_shard(shard):
+    """
+    Serves one shard of the sitemap.
+
+    Args:
+        shard (int): The shard number.
+    """
+    if db.session.get(FeedArtifact, sitemap_key(shard)) is None:
+        max_id = db.session.scalar(select(func.max(Post.id))) or 0
+        if shard > post_shard(max_id):
+            abort(404)
+    return artifact_response(sitemap_key(shard), lambda: build_sitemap_shard(shard), "application/xml")
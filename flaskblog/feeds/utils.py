@@ -0,0 +1,216 @@
+import hashlib
+from datetime import datetime
+
+from flask import current_app, has_request_context, render_template, request
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import joinedload
+
+from flaskblog import db
+from flaskblog.dbutils import upsert
+from flaskblog.models import User, Post, FeedArtifact
+
+SITE_FEED_KEY = "feed"
+SITEMAP_INDEX_KEY = "sitemap"
+
+
+def user_feed_key(user_id):
+    """
+    Returns the artifact key of a user's feed.
+    """
+    return f"feed/user/{user_id}"
+
+
+def sitemap_key(shard):
+    """
+    Returns the artifact key of a sitemap shard.
+    """
+    return f"sitemap/{shard}"
+
+
+def post_shard(post_id):
+    """
+    Returns the sitemap shard listing a post. Shard `n` lists the posts with
+    IDs from `n * SITEMAP_SHARD_SIZE` up to the next shard.
+    """
+    return post_id // current_app.config["SITEMAP_SHARD_SIZE"]
+
+
+def _render(template, **context):
+    """
+    Renders an artifact template with absolute URLs based on `SITE_URL`, or
+    on the current request's host when it is not set.
+    """
+    base_url = current_app.config.get("SITE_URL") or (request.host_url if has_request_context() else None)
+    if not base_url:
+        raise RuntimeError("Set SITE_URL to build feeds outside of a request.")
+    with current_app.test_request_context(base_url=base_url):
+        return render_template(template, **context)
+
+
+def _entry_date(post):
+    return post.updated_at or post.date
+
+
+def _feed_posts(user=None):
+    query = (
+        select(Post)
+        .where(Post.deleted_at.is_(None))
+        .options(joinedload(Post.author))
+        .order_by(Post.date.desc())
+        .limit(current_app.config["FEED_SIZE"])
+    )
+    if user is not None:
+        query = query.where(Post.user_id == user.id)
+    return db.session.scalars(query).all()
+
+
+def build_site_feed():
+    """
+    Renders the Atom feed of the newest posts.
+    """
+    posts = _feed_posts()
+    return _render("feeds/atom.xml", posts=posts, user=None,
+                   updated=max(map(_entry_date, posts), default=datetime(1970, 1, 1)))
+
+
+def build_user_feed(user):
+    """
+    Renders the Atom feed of a user's newest posts.
+
+    Args:
+        user (User): The author.
+    """
+    posts = _feed_posts(user)
+    return _render("feeds/atom.xml", posts=posts, user=user,
+                   updated=max(map(_entry_date, posts), default=datetime(1970, 1, 1)))
+
+
+def build_sitemap_shard(shard):
+    """
+    Renders one sitemap shard: a primary key range scan of at most
+    `SITEMAP_SHARD_SIZE` posts.
+
+    Args:
+        shard (int): The shard number.
+    """
+    size = current_app.config["SITEMAP_SHARD_SIZE"]
+    posts = db.session.execute(
+        select(Post.id, Post.date, Post.updated_at)
+        .where(Post.id >= shard * size, Post.id < (shard + 1) * size, Post.deleted_at.is_(None))
+        .order_by(Post.id)
+    ).all()
+    return _render("feeds/sitemap.xml", posts=posts)
+
+
+def build_sitemap_index():
+    """
+    Renders the sitemap index, listing every shard up to the one holding the
+    newest post with the date its artifact was last rebuilt.
+    """
+    max_id = db.session.scalar(select(func.max(Post.id))) or 0
+    updated = dict(db.session.execute(
+        select(FeedArtifact.key, FeedArtifact.updated_at).where(FeedArtifact.key.like(sitemap_key("%")))
+    ).all())
+    shards = [(shard, updated.get(sitemap_key(shard))) for shard in range(post_shard(max_id) + 1)]
+    return _render("feeds/sitemap_index.xml", shards=shards)
+
+
+def store_artifact(key, build):
+    """
+    Rebuilds an artifact and stores it in the current transaction.
+
+    The artifact row is written before `build` runs. That locks it, so
+    concurrent rebuilds of the same artifact take turns and each one reads
+    the data committed by the one before it.
+
+    Args:
+        key (str): The artifact key.
+        build (callable): Returns the new body.
+
+    Returns:
+        FeedArtifact: The stored artifact.
+    """
+    now = datetime.utcnow()
+    upsert(FeedArtifact, [{"key": key, "body": "", "etag": "", "updated_at": now}],
+           index_elements=["key"], update_columns=["updated_at"])
+    body = build()
+    etag = hashlib.sha1(body.encode()).hexdigest()
+    db.session.execute(update(FeedArtifact).where(FeedArtifact.key == key).values(body=body, etag=etag))
+    return db.session.get(FeedArtifact, key, populate_existing=True)
+
+
+def mark_stale(keys):
+    """
+    Marks artifacts for rebuilding on their next request, in the current
+    transaction.
+
+    A stale artifact keeps its row with an empty ETag; its `updated_at` is
+    set to now, so the sitemap index still dates a changed shard correctly.
+
+    Args:
+        keys (list): The artifact keys.
+    """
+    now = datetime.utcnow()
+    upsert(FeedArtifact, [{"key": key, "body": "", "etag": "", "updated_at": now} for key in keys],
+           index_elements=["key"], update_columns=["etag", "updated_at"])
+
+
+def is_stale(artifact):
+    """
+    Tells whether a stored artifact was marked for rebuilding.
+    """
+    return not artifact.etag
+
+
+def refresh_post_artifacts(post):
+    """
+    Updates the artifacts listing a post after it was created, edited or
+    deleted, in the caller's transaction, after the change was flushed.
+
+    The site feed and the author's feed, a few dozen entries each, are
+    rebuilt right away. The post's sitemap shard (up to `SITEMAP_SHARD_SIZE`
+    rows) and the sitemap index are only marked stale and rebuilt on their
+    next request, so the write transaction does not hold its locks while
+    they render.
+
+    Args:
+        post (Post): The changed post.
+    """
+    # Always claim artifacts in the same order so concurrent writers cannot deadlock.
+    store_artifact(SITE_FEED_KEY, build_site_feed)
+    store_artifact(user_feed_key(post.user_id), lambda: build_user_feed(post.author))
+    mark_stale([sitemap_key(post_shard(post.id)), SITEMAP_INDEX_KEY])
+
+
+def refresh_user_artifacts(user):
+    """
+    Rebuilds the feeds naming a user after their username changed.
+
+    Args:
+        user (User): The user.
+    """
+    store_artifact(SITE_FEED_KEY, build_site_feed)
+    store_artifact(user_feed_key(user.id), lambda: build_user_feed(user))
+
+
+def rebuild_all_artifacts():
+    """
+    Rebuilds every feed and sitemap shard from scratch; used by
+    `flask posts rebuild-feeds`, for example after changing `SITE_URL`.
+
+    Returns:
+        int: The number of artifacts rebuilt.
+    """
+    builds = [(SITE_FEED_KEY, build_site_feed)]
+    author_ids = select(Post.user_id).where(Post.deleted_at.is_(None)).distinct()
+    for user in db.session.scalars(select(User).where(User.id.in_(author_ids))).all():
+        builds.append((user_feed_key(user.id), lambda user=user: build_user_feed(user)))
+    max_id = db.session.scalar(select(func.max(Post.id))) or 0
+    for shard in range(post_shard(max_id) + 1):
+        builds.append((sitemap_key(shard), lambda shard=shard: build_sitemap_shard(shard)))
+    builds.append((SITEMAP_INDEX_KEY, build_sitemap_index))
+
+    for key, build in builds:
+        store_artifact(key, build)
+        db.session.commit()
+    return len(builds)
@@ -1,5 +1,13 @@
-from flask import render_template, Blueprint, request
-from flaskblog.models import Post
+from datetime import datetime
+from flask import render_template, Blueprint, request, abort
+from flask_login import login_required, current_user
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import joinedload
+from flaskblog import db
+from flaskblog.dbutils import encode_cursor, decode_cursor
+from flaskblog.main.utils import (timeline_query, tag_posts_query, tag_cloud_query, archive_posts_query,
+                                  archive_months_query)
+from flaskblog.models import Post, PostScore, Tag, ArchiveMonth
 
 main = Blueprint("main", __name__)
 
@@ -10,14 +18,156 @@ def home():
     Renders the home page with a paginated list of blog posts.
 
     The posts are ordered by date in descending order. The current page number
-    is retrieved from the request arguments.
+    is retrieved from the request arguments. The sidebar shows the tag cloud
+    and the monthly archive.
 
     Returns:
         A rendered template of the home page.
     """
     page = request.args.get('page', 1, type=int)
-    posts = Post.query.order_by(Post.date.desc()).paginate(page=page, per_page=5)
-    return render_template("home.html", posts=posts)
+    posts = Post.visible().order_by(Post.date.desc()).paginate(page=page, per_page=5)
+    tags = db.session.scalars(tag_cloud_query()).all()
+    months = db.session.scalars(archive_months_query()).all()
+    return render_template("home.html", posts=posts, tags=tags, months=months)
+
+
+@main.route("/popular")
+def popular():
+    """
+    Renders the trending posts, most popular first.
+
+    Posts are read from the materialized `PostScore` table through its
+    `(score, post_id)` index, so no likes or comments are aggregated during
+    the request. Pages are addressed with an opaque cursor holding the sort
+    key of the last post shown.
+
+    Returns:
+        A rendered template of the popular posts page.
+    """
+    per_page = 5
+    query = (
+        select(Post, PostScore.score)
+        .join(PostScore, PostScore.post_id == Post.id)
+        .where(Post.deleted_at.is_(None))
+        .options(joinedload(Post.author))
+        .order_by(PostScore.score.desc(), PostScore.post_id.desc())
+        .limit(per_page + 1)
+    )
+    cursor = decode_cursor(request.args.get("after"), 2)
+    if cursor:
+        query = query.where(tuple_(PostScore.score, PostScore.post_id) < tuple(cursor))
+
+    rows = db.session.execute(query).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(rows[-1].score, rows[-1].Post.id)
+    posts = [row.Post for row in rows]
+    return render_template("popular.html", title="Popular", posts=posts, next_cursor=next_cursor)
+
+
+@main.route("/feed")
+@login_required
+def feed():
+    """
+    Renders the current user's personalized timeline.
+
+    The timeline holds the user's own posts and posts by the authors they
+    follow, newest first, read from precomputed timeline entries. Pages are
+    addressed with an opaque cursor holding the date and ID of the last post
+    shown.
+
+    Returns:
+        A rendered template of the feed page.
+    """
+    per_page = 5
+    cursor = decode_cursor(request.args.get("after"), 2)
+    if cursor:
+        try:
+            cursor = (datetime.fromisoformat(cursor[0]), int(cursor[1]))
+        except (TypeError, ValueError):
+            cursor = None
+
+    posts = db.session.scalars(timeline_query(current_user, cursor, limit=per_page + 1)).all()
+    next_cursor = None
+    if len(posts) > per_page:
+        posts = posts[:per_page]
+        next_cursor = encode_cursor(posts[-1].date.isoformat(), posts[-1].id)
+    return render_template("feed.html", title="Your Feed", posts=posts, next_cursor=next_cursor)
+
+
+@main.route("/tag/<name>")
+def tag(name):
+    """
+    Renders the posts filed under a tag, newest first.
+
+    Posts are read through the tag's association index. Pages are addressed
+    with an opaque cursor holding the date and ID of the last post shown.
+
+    Args:
+        name (str): The tag name.
+
+    Returns:
+        A rendered template of the tag page.
+    """
+    tag = db.session.scalar(select(Tag).where(Tag.name == name))
+    if tag is None:
+        abort(404)
+    per_page = 5
+    cursor = decode_cursor(request.args.get("after"), 2)
+    if cursor:
+        try:
+            cursor = (datetime.fromisoformat(cursor[0]), int(cursor[1]))
+        except (TypeError, ValueError):
+            cursor = None
+
+    posts = db.session.scalars(tag_posts_query(tag.id, cursor, limit=per_page + 1)).all()
+    next_cursor = None
+    if len(posts) > per_page:
+        posts = posts[:per_page]
+        next_cursor = encode_cursor(posts[-1].date.isoformat(), posts[-1].id)
+    tags = db.session.scalars(tag_cloud_query()).all()
+    months = db.session.scalars(archive_months_query()).all()
+    return render_template("tag.html", title=f"#{tag.name}", tag=tag, posts=posts, next_cursor=next_cursor,
+                           tags=tags, months=months)
+
+
+@main.route("/archive/<int:year>/<int:month>")
+def archive(year, month):
+    """
+    Renders the posts published in a month, newest first.
+
+    Posts are read with a range scan of the post date index between the
+    month's bounds, and the month's post count comes from the maintained
+    archive rollup. Pages are addressed with an opaque cursor holding the
+    date and ID of the last post shown.
+
+    Args:
+        year (int): The year.
+        month (int): The month, 1 to 12.
+
+    Returns:
+        A rendered template of the archive page.
+    """
+    if not (1 <= year <= 9999 and 1 <= month <= 12):
+        abort(404)
+    per_page = 5
+    cursor = decode_cursor(request.args.get("after"), 2)
+    if cursor:
+        try:
+            cursor = (datetime.fromisoformat(cursor[0]), int(cursor[1]))
+        except (TypeError, ValueError):
+            cursor = None
+
+    posts = db.session.scalars(archive_posts_query(year, month, cursor, limit=per_page + 1)).all()
+    next_cursor = None
+    if len(posts) > per_page:
+        posts = posts[:per_page]
+        next_cursor = encode_cursor(posts[-1].date.isoformat(), posts[-1].id)
+    current = db.session.get(ArchiveMonth, (year, month)) or ArchiveMonth(year=year, month=month, post_count=0)
+    months = db.session.scalars(archive_months_query()).all()
+    return render_template("archive.html", title=current.label, archive=current, posts=posts,
+                           next_cursor=next_cursor, months=months)
 
 
 @main.route("/about")
@@ -0,0 +1,361 @@
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import delete, exists, extract, func, insert, literal, select, true, tuple_, union, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from flaskblog import db
+from flaskblog.dbutils import upsert, upsert_statement
+from flaskblog.models import User, Post, Follow, TimelineEntry, Tag, PostTag, ArchiveMonth
+
+
+def is_fanout_author(user):
+    """
+    Tells whether an author's posts are pushed into follower timelines.
+
+    Authors above `FEED_FANOUT_LIMIT` followers are read-merged instead, since
+    pushing each of their posts would write one row per follower.
+
+    Args:
+        user (User): The author.
+
+    Returns:
+        bool: True if posts are fanned out on write.
+    """
+    return user.followers_count <= current_app.config["FEED_FANOUT_LIMIT"]
+
+
+def fan_out_post(post):
+    """
+    Pushes a new post into the timeline of every follower of its author.
+
+    This is a single `INSERT ... SELECT` over the follow index and is skipped
+    for authors with very many followers.
+
+    Args:
+        post (Post): The newly created (and flushed) post.
+
+    Returns:
+        int: The number of timeline entries written.
+    """
+    if not is_fanout_author(post.author):
+        return 0
+    followers = select(Follow.follower_id, literal(post.id), literal(post.date)).where(
+        Follow.followed_id == post.user_id
+    )
+    result = db.session.execute(
+        insert(TimelineEntry).from_select(["user_id", "post_id", "post_date"], followers)
+    )
+    return result.rowcount
+
+
+def follow(follower, followed):
+    """
+    Makes one user follow another and backfills the follower's timeline.
+
+    The follow row is inserted with `ON CONFLICT DO NOTHING`, so a concurrent
+    double follow leaves the existing row and the follower count alone
+    instead of failing.
+
+    Args:
+        follower (User): The user who follows.
+        followed (User): The user being followed.
+
+    Returns:
+        bool: False if the follower already followed the user.
+    """
+    row = {"follower_id": follower.id, "followed_id": followed.id}
+    stmt = upsert_statement(Follow, db.session.get_bind().dialect.name, ["follower_id", "followed_id"])
+    if stmt is None:
+        try:
+            with db.session.begin_nested():
+                db.session.add(Follow(**row))
+        except IntegrityError:
+            return False
+    elif not db.session.execute(stmt, [row]).rowcount:
+        return False
+
+    followers_count = db.session.scalar(
+        update(User).where(User.id == followed.id)
+        .values(followers_count=User.followers_count + 1)
+        .returning(User.followers_count)
+    )
+    # Keep the loaded user in step without marking it changed.
+    set_committed_value(followed, "followers_count", followers_count)
+    if is_fanout_author(followed):
+        backfill_timelines(followed.id, follower.id)
+    return True
+
+
+def backfill_timelines(author_id, follower_id=None):
+    """
+    Copies an author's newest `FEED_BACKFILL` posts into the timelines of
+    their followers with one `INSERT ... SELECT`. Entries already in a
+    timeline are left alone.
+
+    Args:
+        author_id (int): The author.
+        follower_id (int, optional): Only backfill this follower's timeline.
+    """
+    recent = (
+        select(Post.id, Post.date)
+        .where(Post.user_id == author_id, Post.deleted_at.is_(None))
+        .order_by(Post.date.desc())
+        .limit(current_app.config["FEED_BACKFILL"])
+        .subquery()
+    )
+    # Every follower gets every recent post.
+    rows = (
+        select(Follow.follower_id, recent.c.id, recent.c.date)
+        .join(recent, true())
+        .where(Follow.followed_id == author_id)
+    )
+    if follower_id is not None:
+        rows = rows.where(Follow.follower_id == follower_id)
+    stmt = upsert_statement(TimelineEntry, db.session.get_bind().dialect.name, ["user_id", "post_id"])
+    if stmt is None:
+        stmt = insert(TimelineEntry)
+        rows = rows.where(~exists().where(TimelineEntry.user_id == Follow.follower_id,
+                                          TimelineEntry.post_id == recent.c.id))
+    db.session.execute(stmt.from_select(["user_id", "post_id", "post_date"], rows))
+
+
+def unfollow(follower, followed):
+    """
+    Stops one user following another and removes the author's posts from the
+    follower's timeline.
+
+    When the author drops back to `FEED_FANOUT_LIMIT` followers, their posts
+    stop being merged into timelines at read time and are pushed again. The
+    posts written in the meantime were never pushed, so the remaining
+    followers' timelines are backfilled with the author's newest posts.
+
+    Args:
+        follower (User): The user who follows.
+        followed (User): The user being unfollowed.
+
+    Returns:
+        bool: False if the follower did not follow the user.
+    """
+    removed = db.session.execute(
+        delete(Follow).where(Follow.follower_id == follower.id, Follow.followed_id == followed.id)
+    ).rowcount
+    if not removed:
+        return False
+    followers_count = db.session.scalar(
+        update(User).where(User.id == followed.id)
+        .values(followers_count=User.followers_count - 1)
+        .returning(User.followers_count)
+    )
+    set_committed_value(followed, "followers_count", followers_count)
+    if followers_count == current_app.config["FEED_FANOUT_LIMIT"]:
+        backfill_timelines(followed.id)
+    db.session.execute(
+        delete(TimelineEntry).where(
+            TimelineEntry.user_id == follower.id,
+            TimelineEntry.post_id.in_(select(Post.id).where(Post.user_id == followed.id)),
+        )
+    )
+    return True
+
+
+def timeline_query(user, cursor=None, limit=10):
+    """
+    Builds the query for one page of a user's personalized timeline.
+
+    Pushed entries are read with a range scan of the user's timeline index.
+    Posts by the user themselves and by followed authors that are not fanned
+    out are merged in at query time from the post table. Both sources are
+    combined in a single statement, newest first.
+
+    Args:
+        user (User): The owner of the timeline.
+        cursor (tuple): The `(post_date, post_id)` of the last post on the
+                        previous page, or None for the first page.
+        limit (int): The maximum number of posts to return.
+
+    Returns:
+        Select: A statement selecting `Post` rows with their authors loaded.
+    """
+    pushed = (
+        select(TimelineEntry.post_id, TimelineEntry.post_date)
+        .join(Post, Post.id == TimelineEntry.post_id)
+        .where(TimelineEntry.user_id == user.id, Post.deleted_at.is_(None))
+    )
+
+    pulled_authors = (
+        select(Follow.followed_id)
+        .join(User, User.id == Follow.followed_id)
+        .where(Follow.follower_id == user.id)
+        .where(User.followers_count > current_app.config["FEED_FANOUT_LIMIT"])
+    )
+    pulled = select(Post.id.label("post_id"), Post.date.label("post_date")).where(
+        (Post.user_id == user.id) | Post.user_id.in_(pulled_authors),
+        Post.deleted_at.is_(None),
+    )
+
+    if cursor:
+        pushed = pushed.where(tuple_(TimelineEntry.post_date, TimelineEntry.post_id) < cursor)
+        pulled = pulled.where(tuple_(Post.date, Post.id) < cursor)
+
+    # Each source is limited on its own index before merging, so a page never
+    # reads more than `limit` rows from either side.
+    pushed = pushed.order_by(TimelineEntry.post_date.desc(), TimelineEntry.post_id.desc()).limit(limit)
+    pulled = pulled.order_by(Post.date.desc(), Post.id.desc()).limit(limit)
+    entries = union(select(pushed.subquery()), select(pulled.subquery())).subquery()
+
+    return (
+        select(Post)
+        .join(entries, entries.c.post_id == Post.id)
+        .options(joinedload(Post.author))
+        .order_by(entries.c.post_date.desc(), entries.c.post_id.desc())
+        .limit(limit)
+    )
+
+
+def tag_posts_query(tag_id, cursor=None, limit=10):
+    """
+    Builds the query for one page of the posts with a tag, newest first.
+
+    The page is a range scan of the `(tag_id, post_date, post_id)` index,
+    continuing below the cursor.
+
+    Args:
+        tag_id (int): The ID of the tag.
+        cursor (tuple): The `(post_date, post_id)` of the last post on the
+                        previous page, or None for the first page.
+        limit (int): The maximum number of posts to return.
+
+    Returns:
+        Select: A statement selecting `Post` rows with their authors loaded.
+    """
+    query = (
+        select(Post)
+        .join(PostTag, PostTag.post_id == Post.id)
+        .where(PostTag.tag_id == tag_id, Post.deleted_at.is_(None))
+        .options(joinedload(Post.author))
+        .order_by(PostTag.post_date.desc(), PostTag.post_id.desc())
+        .limit(limit)
+    )
+    if cursor:
+        query = query.where(tuple_(PostTag.post_date, PostTag.post_id) < cursor)
+    return query
+
+
+def tag_cloud_query(limit=30):
+    """
+    Builds the query for the most used tags, read from their maintained
+    `post_count` through its index rather than by counting posts.
+
+    Args:
+        limit (int): The maximum number of tags to return.
+
+    Returns:
+        Select: A statement selecting `Tag` rows, most used first.
+    """
+    return (
+        select(Tag)
+        .where(Tag.post_count > 0)
+        .order_by(Tag.post_count.desc(), Tag.name)
+        .limit(limit)
+    )
+
+
+def month_range(year, month):
+    """
+    Returns the `[start, end)` datetimes of a calendar month.
+
+    Args:
+        year (int): The year.
+        month (int): The month, 1 to 12.
+
+    Returns:
+        tuple: The first instant of the month and of the following month.
+    """
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+
+def adjust_archive_count(post_date, delta):
+    """
+    Adds `delta` to the archive count of the month a post is dated in.
+
+    Called in the same transaction as every post creation (+1) and deletion
+    (-1), so the counts stay exact without aggregating the post table.
+
+    Args:
+        post_date (datetime): The post's date.
+        delta (int): The change in the number of visible posts.
+    """
+    upsert(ArchiveMonth, [{"year": post_date.year, "month": post_date.month, "post_count": delta}],
+           index_elements=["year", "month"], increment_columns=["post_count"])
+
+
+def rebuild_archive_counts():
+    """
+    Recounts the monthly archive from the post table in one aggregate; used
+    by `flask posts rebuild-archive` to repair the counts after posts were
+    changed outside the application. Commits the transaction.
+
+    Returns:
+        int: The number of months with posts.
+    """
+    year = extract("year", Post.date)
+    month = extract("month", Post.date)
+    db.session.execute(delete(ArchiveMonth))
+    result = db.session.execute(insert(ArchiveMonth).from_select(
+        ["year", "month", "post_count"],
+        select(year, month, func.count()).where(Post.deleted_at.is_(None)).group_by(year, month),
+    ))
+    db.session.commit()
+    return result.rowcount
+
+
+def archive_posts_query(year, month, cursor=None, limit=10):
+    """
+    Builds the query for one page of the posts published in a month, newest
+    first.
+
+    The page is a range scan of the post date index between the month's
+    bounds, continuing below the cursor.
+
+    Args:
+        year (int): The year.
+        month (int): The month, 1 to 12.
+        cursor (tuple): The `(date, id)` of the last post on the previous
+                        page, or None for the first page.
+        limit (int): The maximum number of posts to return.
+
+    Returns:
+        Select: A statement selecting `Post` rows with their authors loaded.
+    """
+    start, end = month_range(year, month)
+    query = (
+        select(Post)
+        .where(Post.date >= start, Post.date < end, Post.deleted_at.is_(None))
+        .options(joinedload(Post.author))
+        .order_by(Post.date.desc(), Post.id.desc())
+        .limit(limit)
+    )
+    if cursor:
+        # The index covers the date alone; the plain bound lets it narrow the scan.
+        query = query.where(Post.date <= cursor[0], tuple_(Post.date, Post.id) < cursor)
+    return query
+
+
+def archive_months_query():
+    """
+    Builds the query for the archive sidebar: every month with posts, newest
+    first, read from the maintained monthly counts.
+
+    Returns:
+        Select: A statement selecting `ArchiveMonth` rows.
+    """
+    return (
+        select(ArchiveMonth)
+        .where(ArchiveMonth.post_count > 0)
+        .order_by(ArchiveMonth.year.desc(), ArchiveMonth.month.desc())
+    )
@@ -32,6 +32,7 @@ class User(db.Model, UserMixin):
         email (str): The user's unique email address.
         image_file (str): The filename of the user's profile picture.
         password (str): The user's hashed password.
+        followers_count (int): The number of users following this user.
         posts (relationship): A relationship to the posts created by the user.
     """
     id = db.Column(db.Integer, primary_key=True)
@@ -39,6 +40,7 @@ class User(db.Model, UserMixin):
     email = db.Column(db.String(120), unique=True, nullable=False)
     image_file = db.Column(db.String(20), nullable=False, default="default.jpg")
     password = db.Column(db.String(60), nullable=False)
+    followers_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     posts = db.relationship("Post", backref="author", lazy=True)
 
     def __repr__(self):
@@ -88,22 +90,68 @@ class Post(db.Model):
         id (int): The primary key for the post.
         title (str): The title of the post.
         date (datetime): The date and time the post was created.
-        content (str): The content of the post.
+        updated_at (datetime): When the post was last edited, or None.
+        content (str): The Markdown source of the post.
+        content_html (str): The sanitized HTML rendered from `content`.
+        render_version (int): The renderer version `content_html` was built with.
+        views (int): The number of times the post has been viewed.
+        like_count (int): The number of likes, kept in step with the like table
+                          by `toggle_like`.
+        deleted_at (datetime): When the post was soft-deleted, or None.
         user_id (int): The foreign key of the user who created the post.
         likes (relationship): A relationship to the likes on the post.
+        comments (relationship): A relationship to the comments on the post.
+        tags (relationship): The post's tags, by name. Read-only; tags are
+                             assigned with `set_post_tags`.
+
+    Posts are indexed by date for the home page and by author and date for
+    profile pages. Only soft-deleted posts are indexed by `deleted_at`, so the
+    index serves the purge job without attracting queries for visible posts.
+
+    Likes, comments and other rows that reference a post are removed by the
+    database (`ON DELETE CASCADE`); `passive_deletes` keeps the ORM from
+    loading them first.
     """
+    __table_args__ = (
+        db.Index('ix_post_date', 'date'),
+        db.Index('ix_post_user_id_date', 'user_id', 'date'),
+        db.Index('ix_post_deleted_at', 'deleted_at',
+                 sqlite_where=db.text('deleted_at IS NOT NULL'),
+                 postgresql_where=db.text('deleted_at IS NOT NULL')),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime)
     content = db.Column(db.Text, nullable=False)
+    content_html = db.Column(db.Text)
+    render_version = db.Column(db.Integer)
+    views = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    deleted_at = db.Column(db.DateTime)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
     # Relationship to track likes
-    likes = db.relationship('Like', backref='post', lazy=True)
+    likes = db.relationship('Like', backref='post', lazy=True,
+                            cascade='all, delete-orphan', passive_deletes=True)
+    comments = db.relationship('Comment', backref='post', lazy=True,
+                               cascade='all, delete-orphan', passive_deletes=True)
+    tags = db.relationship('Tag', secondary='post_tag', lazy=True, viewonly=True, order_by='Tag.name')
 
     def __repr__(self):
         return f"Post('{self.title}', '{self.date}')"
 
+    @classmethod
+    def visible(cls):
+        """
+        Returns a query over posts that have not been soft-deleted.
+
+        Returns:
+            Query: A query filtered to visible posts.
+        """
+        return cls.query.filter(cls.deleted_at.is_(None))
+
 
 class Like(db.Model):
     """
@@ -116,10 +164,17 @@ class Like(db.Model):
         id (int): The primary key for the like.
         user_id (int): The foreign key of the user who liked the post.
         post_id (int): The foreign key of the post that was liked.
+
+    A user can like a post only once, which the unique index enforces.
     """
+    __table_args__ = (
+        db.Index('ix_like_user_id_post_id', 'user_id', 'post_id', unique=True),
+        db.Index('ix_like_post_id', 'post_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), nullable=False)
 
     def __repr__(self):
         return f"Like('{self.user_id}', '{self.post_id}')"
@@ -131,20 +186,273 @@ class Comment(db.Model):
 
     Attributes:
         id (int): The primary key for the comment.
-        content (str): The text content of the comment.
+        content (str): The Markdown source of the comment.
+        content_html (str): The sanitized HTML rendered from `content`.
+        render_version (int): The renderer version `content_html` was built with.
         date_posted (datetime): The date and time the comment was posted.
         user_id (int): The foreign key of the user who wrote the comment.
         post_id (int): The foreign key of the post that was commented on.
+        parent_id (int): The foreign key of the comment this one replies to, or
+                         None for a top-level comment.
+        path (str): The materialized path of the comment in its thread: one
+                    fixed-width hex segment per level, ending with its own.
+                    Ordering a post's comments by `path` lists every thread
+                    depth-first, newest top-level comments first (their
+                    segment is the inverted ID) and replies oldest first.
         author (relationship): A relationship to the user who wrote the comment.
     """
+    __table_args__ = (
+        db.Index('ix_comment_post_id_path', 'post_id', 'path'),
+        db.Index('ix_comment_user_id', 'user_id'),
+    )
+
+    # Characters per level of `path`, and the deepest level replies may reach.
+    PATH_SEGMENT_LENGTH = 8
+    MAX_DEPTH = 8
+
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
+    content_html = db.Column(db.Text)
+    render_version = db.Column(db.Integer)
     date_posted = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), nullable=False)
+    parent_id = db.Column(db.Integer, db.ForeignKey('comment.id', ondelete='CASCADE'))
+    path = db.Column(db.String(PATH_SEGMENT_LENGTH * MAX_DEPTH), nullable=False)
 
     # Relationship to access the user who wrote the comment
     author = db.relationship('User', backref='comments', lazy=True)
 
+    @property
+    def depth(self):
+        """
+        The nesting level of the comment, 0 for top-level comments.
+        """
+        return len(self.path) // self.PATH_SEGMENT_LENGTH - 1
+
+    def __repr__(self):
+        return f"Comment('{self.content}', '{self.date_posted}')"
+
+class PostScore(db.Model):
+    """
+    Materialized trending score of a post, read by the popular feed.
+
+    Scores are maintained by `flask posts refresh-scores` and never computed
+    during a request. See `flaskblog.posts.utils.trending_score` for the
+    formula.
+
+    Attributes:
+        post_id (int): The primary key, and the foreign key of the scored post.
+        score (float): The time-decayed trending score.
+        likes (int): The number of likes when the score was computed.
+        comments (int): The number of comments when the score was computed.
+        refreshed_at (datetime): When the score was last recomputed.
+    """
+    __table_args__ = (
+        db.Index('ix_post_score_score_post_id', 'score', 'post_id'),
+    )
+
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+    likes = db.Column(db.Integer, nullable=False, default=0)
+    comments = db.Column(db.Integer, nullable=False, default=0)
+    refreshed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    post = db.relationship('Post', lazy=True)
+
+    def __repr__(self):
+        return f"PostScore('{self.post_id}', '{self.score}')"
+
+
+class PostScoreQueue(db.Model):
+    """
+    Posts whose trending score needs to be recomputed.
+
+    A row is written whenever a post is created, liked, unliked or commented
+    on, so the refresh job only processes posts touched since its last run.
+
+    Attributes:
+        post_id (int): The primary key, and the foreign key of the touched post.
+        touched_at (datetime): When the post was last touched.
+    """
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), primary_key=True)
+    touched_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"PostScoreQueue('{self.post_id}', '{self.touched_at}')"
+
+
+
+class Follow(db.Model):
+    """
+    Represents one user following another.
+
+    Attributes:
+        follower_id (int): The foreign key of the user who follows.
+        followed_id (int): The foreign key of the user being followed.
+        created_at (datetime): When the follow started.
+    """
+    __table_args__ = (
+        db.Index('ix_follow_followed_id', 'followed_id'),
+    )
+
+    follower_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    followed_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"Follow('{self.follower_id}', '{self.followed_id}')"
+
+
+class UserStats(db.Model):
+    """
+    Profile statistics of a user, kept as running totals.
+
+    The counts are adjusted in the same transaction as every post, like and
+    comment write, so profile pages read them with one primary key lookup
+    instead of aggregating the post, like and comment tables.
+    `flask users repair-stats` recomputes them if they ever drift.
+
+    Attributes:
+        user_id (int): The primary key and foreign key of the user.
+        post_count (int): The number of the user's visible posts.
+        likes_received (int): The number of likes on the user's visible posts.
+        comments_received (int): The number of comments on the user's visible posts.
+    """
+    __tablename__ = 'user_stats'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    likes_received = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    comments_received = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    def __repr__(self):
+        return f"UserStats('{self.user_id}', '{self.post_count}', '{self.likes_received}', '{self.comments_received}')"
+
+
+class TimelineEntry(db.Model):
+    """
+    A post pushed into a follower's precomputed timeline.
+
+    Entries are written when an author with a modest number of followers
+    publishes a post (fan-out on write). Posts of authors with very many
+    followers are not pushed; they are merged in when the timeline is read.
+
+    Attributes:
+        user_id (int): The foreign key of the user who owns the timeline.
+        post_id (int): The foreign key of the post in the timeline.
+        post_date (datetime): A copy of the post's date, so the timeline can be
+                              read in order from the index alone.
+    """
+    __table_args__ = (
+        db.Index('ix_timeline_entry_user_id_post_date', 'user_id', 'post_date', 'post_id'),
+    )
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), primary_key=True)
+    post_date = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"TimelineEntry('{self.user_id}', '{self.post_id}')"
+
+
+class Tag(db.Model):
+    """
+    A tag that posts can be filed under.
+
+    Attributes:
+        id (int): The primary key for the tag.
+        name (str): The unique, normalized tag name.
+        post_count (int): The number of posts with the tag, adjusted in the
+                          same transaction as every tag assignment, so the tag
+                          cloud never has to count the association table.
+    """
+    __table_args__ = (
+        db.Index('ix_tag_post_count', 'post_count'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(32), unique=True, nullable=False)
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    def __repr__(self):
+        return f"Tag('{self.name}', '{self.post_count}')"
+
+
+class PostTag(db.Model):
+    """
+    Associates a post with one of its tags.
+
+    Attributes:
+        post_id (int): The foreign key of the tagged post.
+        tag_id (int): The foreign key of the tag.
+        post_date (datetime): A copy of the post's date, so a tag's posts can
+                              be read newest first from the
+                              `(tag_id, post_date, post_id)` index alone.
+    """
+    __table_args__ = (
+        db.Index('ix_post_tag_tag_id_post_date', 'tag_id', 'post_date', 'post_id'),
+    )
+
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), primary_key=True)
+    tag_id = db.Column(db.Integer, db.ForeignKey('tag.id', ondelete='CASCADE'), primary_key=True)
+    post_date = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"PostTag('{self.post_id}', '{self.tag_id}')"
+
+
+class ArchiveMonth(db.Model):
+    """
+    The number of visible posts published in one calendar month.
+
+    Counts are adjusted in the same transaction as every post creation and
+    deletion, so the archive sidebar never aggregates the post table.
+
+    Attributes:
+        year (int): The year.
+        month (int): The month, 1 to 12.
+        post_count (int): The number of visible posts dated in that month.
+    """
+    __tablename__ = 'archive_month'
+
+    year = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Integer, primary_key=True)
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    @property
+    def label(self):
+        """
+        The month's display name, such as "October 2026".
+        """
+        return f"{datetime(self.year, self.month, 1):%B %Y}"
+
+    def __repr__(self):
+        return f"ArchiveMonth('{self.year}-{self.month:02d}', '{self.post_count}')"
+
+
+class FeedArtifact(db.Model):
+    """
+    A precomputed feed or sitemap document, served as stored.
+
+    Feeds are rebuilt when the posts they list change. Sitemap shards and
+    the index are marked stale instead (an empty `etag`) and rebuilt by the
+    first request after the change, so crawlers and feed readers usually
+    cost one primary key lookup per request.
+
+    Attributes:
+        key (str): The artifact name, such as "feed", "feed/user/3",
+                   "sitemap" or "sitemap/0".
+        body (str): The XML document.
+        etag (str): A hash of `body`, used as the response's ETag; empty
+                    while the artifact is stale.
+        updated_at (datetime): When the artifact was last rebuilt, used as the
+                               response's Last-Modified date.
+    """
+    key = db.Column(db.String(64), primary_key=True)
+    body = db.Column(db.Text, nullable=False)
+    etag = db.Column(db.String(40), nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
     def __repr__(self):
-        return f"Comment('{self.content}', '{self.date_posted}')"
\ No newline at end of file
+        return f"FeedArtifact('{self.key}', '{self.updated_at}')"
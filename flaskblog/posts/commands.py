@@ -0,0 +1,147 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import or_, select, update
+
+from flaskblog import db
+from flaskblog.models import Post, Comment
+from flaskblog.posts.utils import RENDERER_VERSION, render_batch, refresh_scores, purge_deleted_posts
+from flaskblog.feeds.utils import rebuild_all_artifacts
+from flaskblog.main.utils import rebuild_archive_counts
+
+posts_cli = AppGroup("posts", help="Maintenance commands for posts and comments.")
+
+
+def _stale_batches(model, batch_size):
+    """
+    Yields `(id, content)` batches of rows rendered with an older renderer.
+
+    Rows are walked in primary key order (keyset pagination) so each batch is
+    a single indexed range scan no matter how large the table is.
+
+    Args:
+        model: The model class to scan (`Post` or `Comment`).
+        batch_size (int): The number of rows per batch.
+
+    Yields:
+        list: A list of `(id, content)` tuples.
+    """
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(model.id, model.content)
+            .where(model.id > last_id)
+            .where(or_(model.render_version.is_(None), model.render_version != RENDERER_VERSION))
+            .order_by(model.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        yield [tuple(row) for row in rows]
+
+
+@posts_cli.command("rerender")
+@click.option("--workers", type=int, default=None, help="Number of worker processes (default: CPU count).")
+@click.option("--batch-size", type=int, default=200, show_default=True, help="Rows rendered per task.")
+def rerender(workers, batch_size):
+    """
+    Re-renders the cached HTML of posts and comments.
+
+    Only rows whose `render_version` differs from the current renderer are
+    touched. Rendering runs across a process pool and results are written
+    back with batched UPDATEs.
+    """
+    workers = workers or os.cpu_count() or 1
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for model in (Post, Comment):
+            total = 0
+            pending = []
+            for batch in _stale_batches(model, batch_size):
+                pending.append(pool.submit(render_batch, batch))
+                # Keep a bounded number of batches in flight.
+                if len(pending) >= workers * 2:
+                    total += _write_batch(model, pending.pop(0).result())
+            for future in pending:
+                total += _write_batch(model, future.result())
+            click.echo(f"Re-rendered {total} {model.__tablename__} row(s).")
+
+
+def _write_batch(model, values):
+    """
+    Writes a batch of rendered rows back with a bulk UPDATE by primary key.
+
+    Args:
+        model: The model class being updated.
+        values (list): Dicts with `id`, `content_html` and `render_version`.
+
+    Returns:
+        int: The number of rows written.
+    """
+    db.session.execute(update(model), values)
+    db.session.commit()
+    return len(values)
+
+
+@posts_cli.command("refresh-scores")
+@click.option("--batch-size", type=int, default=500, show_default=True, help="Posts rescored per transaction.")
+@click.option("--interval", type=int, default=None,
+              help="Keep running, refreshing every INTERVAL seconds, instead of exiting after one pass.")
+def refresh_scores_command(batch_size, interval):
+    """
+    Recomputes trending scores for posts touched since the last run.
+
+    Schedule this from cron, or run it with --interval as a long-lived
+    process.
+    """
+    while True:
+        click.echo(f"Refreshed {refresh_scores(batch_size)} post score(s).")
+        if interval is None:
+            return
+        time.sleep(interval)
+
+
+@posts_cli.command("purge-deleted")
+@click.option("--batch-size", type=int, default=500, show_default=True, help="Maximum rows deleted per statement.")
+@click.option("--interval", type=int, default=None,
+              help="Keep running, purging every INTERVAL seconds, instead of exiting after one pass.")
+def purge_deleted_command(batch_size, interval):
+    """
+    Permanently removes soft-deleted posts and their likes, comments and
+    other child rows in bounded batches.
+    """
+    while True:
+        click.echo(f"Purged {purge_deleted_posts(batch_size)} post(s).")
+        if interval is None:
+            return
+        time.sleep(interval)
+
+
+@posts_cli.command("rebuild-feeds")
+def rebuild_feeds_command():
+    """
+    Rebuilds the stored Atom feeds and sitemap shards from scratch.
+
+    Posting, editing and deleting keep them up to date; run this after
+    changing SITE_URL, FEED_SIZE or SITEMAP_SHARD_SIZE, or after importing
+    posts directly into the database.
+    """
+    if not current_app.config.get("SITE_URL"):
+        raise click.UsageError("Set SITE_URL so the feeds can link to the site.")
+    click.echo(f"Rebuilt {rebuild_all_artifacts()} feed and sitemap artifact(s).")
+
+
+@posts_cli.command("rebuild-archive")
+def rebuild_archive_command():
+    """
+    Recounts the posts of every month in the archive.
+
+    Posting and deleting keep the counts up to date; run this after
+    importing or deleting posts directly in the database.
+    """
+    click.echo(f"Counted posts in {rebuild_archive_counts()} month(s).")
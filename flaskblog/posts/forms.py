@@ -1,6 +1,8 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, TextAreaField, SubmitField
-from wtforms.validators import DataRequired
+from wtforms import StringField, TextAreaField, SubmitField, IntegerField
+from wtforms.validators import DataRequired, Optional, ValidationError
+from wtforms.widgets import HiddenInput
+from flaskblog.posts.utils import MAX_TAGS, TAG_PATTERN, parse_tags
 
 
 class PostForm(FlaskForm):
@@ -10,12 +12,31 @@ class PostForm(FlaskForm):
     Attributes:
         title (StringField): The title of the post, which is a required field.
         content (TextAreaField): The content of the post, which is a required field.
+        tags (StringField): Optional tags, separated by commas or spaces.
         submit (SubmitField): The button to submit the form.
     """
     title = StringField("Title", validators=[DataRequired()])
     content = TextAreaField("Content", validators=[DataRequired()])
+    tags = StringField("Tags", validators=[Optional()])
     submit = SubmitField("Post")
 
+    def validate_tags(self, tags):
+        """
+        Validates the tag names.
+
+        Args:
+            tags (StringField): The tags field to validate.
+
+        Raises:
+            ValidationError: If there are too many tags or a tag is malformed.
+        """
+        names = parse_tags(tags.data)
+        if len(names) > MAX_TAGS:
+            raise ValidationError(f"Use at most {MAX_TAGS} tags.")
+        for name in names:
+            if not TAG_PATTERN.fullmatch(name):
+                raise ValidationError(f"Invalid tag '{name}': use letters, digits and hyphens.")
+
 
 class CommentForm(FlaskForm):
     """
@@ -23,7 +44,9 @@ class CommentForm(FlaskForm):
 
     Attributes:
         content (TextAreaField): The content of the comment, which is a required field.
+        parent_id (IntegerField): The hidden ID of the comment being replied to, if any.
         submit (SubmitField): The button to submit the comment.
     """
     content = TextAreaField("Comment", validators=[DataRequired()])
+    parent_id = IntegerField(widget=HiddenInput(), validators=[Optional()])
     submit = SubmitField("Post Comment")
\ No newline at end of file
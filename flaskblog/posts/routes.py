@@ -1,8 +1,18 @@
-from flask import render_template, redirect, request, Blueprint, url_for, flash, abort
+from datetime import datetime
+from flask import render_template, redirect, request, Blueprint, url_for, flash, abort, current_app, jsonify
 from flask_login import login_required, current_user
-from flaskblog import db
-from flaskblog.models import Post, Comment, Like
+from sqlalchemy.exc import IntegrityError
+from flaskblog import db, view_counter, limiter, events, read_only
+from flaskblog.models import Post, Comment
 from flaskblog.posts.forms import PostForm, CommentForm
+from flaskblog.posts.utils import (render_content, queue_score_refresh, liked_query, toggle_like, wants_json,
+                                   post_channel, publish_comment, publish_likes, event_stream_response,
+                                   add_comment, comment_page_query, comment_page_start, comment_page,
+                                   parse_tags, set_post_tags, remove_post_stats)
+from flaskblog.users.utils import adjust_user_stats
+from flaskblog.main.utils import fan_out_post, adjust_archive_count
+from flaskblog.feeds.utils import refresh_post_artifacts
+from flaskblog.readonly import SNAPSHOT_ENVIRON_KEY
 
 posts = Blueprint("posts", __name__)
 
@@ -14,8 +24,11 @@ def new_post():
     """
     Renders the form to create a new post and handles form submission.
 
-    If the form is submitted and valid, a new post is created and saved to the
-    database. The user is then redirected to the home page.
+    If the form is submitted and valid, a new post is created, its Markdown is
+    rendered to sanitized HTML once, and it is saved to the database with its
+    tags, pushed into the timelines of the author's followers, counted in
+    the monthly archive and the author's statistics and added to the stored
+    feeds and sitemap. The user is then redirected to the home page.
 
     Returns:
         A rendered template for creating a new post or a redirect to the home page.
@@ -23,7 +36,15 @@ def new_post():
     form = PostForm()
     if form.validate_on_submit():
         post = Post(title=form.title.data, content=form.content.data, author=current_user)
+        render_content(post)
         db.session.add(post)
+        db.session.flush()
+        set_post_tags(post, parse_tags(form.tags.data))
+        queue_score_refresh(post.id)
+        fan_out_post(post)
+        adjust_archive_count(post.date, 1)
+        adjust_user_stats(current_user.id, posts=1)
+        refresh_post_artifacts(post)
         db.session.commit()
         flash("Your post have been created", "success")
         return redirect(url_for("main.home"))
@@ -31,9 +52,18 @@ def new_post():
 
 
 @posts.route("/post/<int:post_id>", methods=['GET', 'POST'])
+@limiter.limit
 def post(post_id):
     """
-    Displays a single post and handles new comments.
+    Displays a single post with a page of its comment threads, and handles
+    new comments and replies.
+
+    Each GET records a view in the buffered view counter; the database is
+    updated in batches rather than on every hit. Renders for read-only
+    snapshots are not counted. Comments are paged by
+    top-level comment with the `comments` cursor, and each page and its
+    replies are loaded with one range query (see `comment_page_query`). New
+    comments are pushed to the post's live event stream.
 
     Args:
         post_id (int): The ID of the post to display.
@@ -41,16 +71,60 @@ def post(post_id):
     Returns:
         A rendered template of the post page, including its content and comments.
     """
-    post = Post.query.get_or_404(post_id)
+    post = Post.visible().filter_by(id=post_id).first_or_404()
     form = CommentForm()
     if form.validate_on_submit():
-        comment = Comment(content=form.content.data, user_id=current_user.id, post_id=post.id)
-        db.session.add(comment)
+        parent = None
+        if form.parent_id.data is not None:
+            parent = db.session.get(Comment, form.parent_id.data)
+            if parent is None or parent.post_id != post.id:
+                abort(404)
+        comment = add_comment(post, current_user, form.content.data, parent)
         db.session.commit()
+        publish_comment(comment)
         flash('Your comment has been posted!', 'success')
         return redirect(url_for('posts.post', post_id=post.id))
-    comments = Comment.query.filter_by(post_id=post.id).order_by(Comment.date_posted.desc()).all()
-    return render_template('post.html', title=post.title, post=post, form=form, comments=comments)
+    if request.method == "GET":
+        form.parent_id.data = request.args.get("reply_to", type=int)
+    if not request.environ.get(SNAPSHOT_ENVIRON_KEY):
+        view_counter.increment(post.id)
+    start = comment_page_start()
+    comments, next_start = comment_page(db.session.execute(
+        comment_page_query(post.id, start, current_app.config["COMMENTS_PER_PAGE"])
+    ).all())
+    liked = current_user.is_authenticated and db.session.scalar(liked_query(current_user.id, post.id))
+    return render_template('post.html', title=post.title, post=post, form=form, comments=comments,
+                           comments_start=start, next_comments=next_start, liked=liked)
+
+
+@posts.route("/post/<int:post_id>/events")
+def post_events(post_id):
+    """
+    Streams live updates of a post as Server-Sent Events.
+
+    Subscribers receive a "comment" event with the rendered HTML of each new
+    comment and a "likes" event with the new count whenever the post is
+    liked or unliked. A reconnecting client sends the `Last-Event-ID` header
+    and first receives the events it missed.
+
+    Streams are served by the async version of this view, which holds no
+    thread. This view only streams for the few requests the ASGI app hands
+    to its thread pool, such as the first one restoring a remembered login.
+    Under a WSGI server, where a stream would hold a worker for up to
+    `EVENTS_STREAM_TIMEOUT` seconds, it answers 204 No Content, which tells
+    the browser's EventSource to stop reconnecting.
+
+    Args:
+        post_id (int): The ID of the post.
+
+    Returns:
+        A `text/event-stream` response, or an empty 204 response.
+    """
+    if not events.streams_available():
+        return "", 204
+    post = Post.visible().filter_by(id=post_id).first_or_404()
+    last_event_id = request.headers.get("Last-Event-ID", type=int)
+    return event_stream_response(events.stream(post_channel(post.id), last_event_id))
 
 
 @posts.route("/post/<int:post_id>/update", methods=["POST", "GET"])
@@ -60,7 +134,8 @@ def update_post(post_id):
     Renders the form to update an existing post and handles form submission.
 
     The user must be the author of the post to update it. If the form is
-    submitted and valid, the post is updated in the database.
+    submitted and valid, the post and its tags are updated in the database,
+    and the feeds and sitemap listing the post are rebuilt.
 
     Args:
         post_id (int): The ID of the post to update.
@@ -68,7 +143,7 @@ def update_post(post_id):
     Returns:
         A rendered template for updating a post or a redirect to the post page.
     """
-    post = Post.query.get_or_404(post_id)
+    post = Post.visible().filter_by(id=post_id).first_or_404()
 
     if post.author != current_user:
         abort(403)
@@ -77,12 +152,18 @@ def update_post(post_id):
     if form.validate_on_submit():
         post.title = form.title.data
         post.content = form.content.data
+        post.updated_at = datetime.utcnow()
+        render_content(post)
+        set_post_tags(post, parse_tags(form.tags.data))
+        db.session.flush()
+        refresh_post_artifacts(post)
         db.session.commit()
         flash("Your post has been upadated!", "success")
         return redirect(url_for("posts.post", post_id=post.id))
     elif request.method == "GET":
         form.title.data = post.title
         form.content.data = post.content
+        form.tags.data = ", ".join(tag.name for tag in post.tags)
     return render_template("create_post.html", title="Update Post", form=form, legend="Update Post")
 
 
@@ -93,7 +174,14 @@ def delete_post(post_id):
     Deletes a specific post from the database.
 
     The user must be the author of the post to delete it. This route only
-    accepts POST requests.
+    accepts POST requests. Likes, comments and other child rows are deleted
+    by the database through `ON DELETE CASCADE`. When `POST_SOFT_DELETE` is
+    enabled the post is only hidden here, and `flask posts purge-deleted`
+    removes it and its children later. Either way its tags are removed, the
+    archive count of its month and its author's statistics are decremented
+    and the feeds and sitemap are rebuilt right away, so tag counts, tag
+    pages, the archive, profiles and feeds only include visible posts. Its
+    read-only snapshot is discarded too.
 
     Args:
         post_id (int): The ID of the post to delete.
@@ -101,13 +189,22 @@ def delete_post(post_id):
     Returns:
         A redirect to the home page after deleting the post.
     """
-    post = Post.query.get_or_404(post_id)
+    post = Post.visible().filter_by(id=post_id).first_or_404()
 
     if post.author != current_user:
         abort(403)
 
-    db.session.delete(post)
+    set_post_tags(post, [])
+    remove_post_stats(post)
+    if current_app.config["POST_SOFT_DELETE"]:
+        post.deleted_at = datetime.utcnow()
+    else:
+        db.session.delete(post)
+    adjust_archive_count(post.date, -1)
+    db.session.flush()
+    refresh_post_artifacts(post)
     db.session.commit()
+    read_only.discard_snapshot(url_for("posts.post", post_id=post_id))
 
     flash("Your post has been deleted!", "success")
     return redirect(url_for("main.home"))
@@ -115,32 +212,40 @@ def delete_post(post_id):
 
 @posts.route("/post/<int:post_id>/like", methods=['POST'])
 @login_required
+@limiter.limit
 def like_post(post_id):
     """
     Toggles the like status of a post for the current user.
 
     If the user has already liked the post, the like is removed. Otherwise,
-    a new like is added.
+    a new like is added, and the new count is pushed to the post's live
+    event stream. Clients that ask for JSON in their `Accept` header get the
+    new state back instead of a redirect, so the like button can be updated
+    in place without reloading the post page.
 
     Args:
         post_id (int): The ID of the post to like or dislike.
 
     Returns:
-        A redirect to the post page.
+        A redirect to the post page, or a JSON object with `liked` and `likes`.
     """
-    post = Post.query.get_or_404(post_id)
-    like = Like.query.filter_by(user_id=current_user.id, post_id=post_id).first()
+    try:
+        result = toggle_like(current_user.id, post_id)
+    except IntegrityError:
+        # A concurrent request inserted the same like first; toggle on top of it.
+        db.session.rollback()
+        result = toggle_like(current_user.id, post_id)
+    if result is None:
+        db.session.rollback()
+        abort(404)
+    db.session.commit()
 
-    if like:
-        # If the user already liked the post, remove the like
-        db.session.delete(like)
-        db.session.commit()
-        flash('You disliked the post.', 'info')
-    else:
-        # Otherwise, add a new like
-        new_like = Like(user_id=current_user.id, post_id=post_id)
-        db.session.add(new_like)
-        db.session.commit()
+    liked, like_count = result
+    publish_likes(post_id, like_count)
+    if wants_json():
+        return jsonify(liked=liked, likes=like_count)
+    if liked:
         flash('You liked the post!', 'success')
-
+    else:
+        flash('You disliked the post.', 'info')
     return redirect(url_for('posts.post', post_id=post_id))
\ No newline at end of file
@@ -0,0 +1,548 @@
+import math
+import re
+from datetime import datetime
+
+import bleach
+import markdown
+from flask import Response, current_app, render_template, request
+from sqlalchemy import bindparam, delete, exists, func, insert, select, tuple_, update
+from sqlalchemy.orm import joinedload
+
+from flaskblog import db, events
+from flaskblog.dbutils import upsert
+from flaskblog.models import Post, Like, Comment, PostScore, PostScoreQueue, Tag, PostTag
+from flaskblog.users.utils import adjust_user_stats
+
+
+# Bump this whenever the Markdown extensions or the sanitizer allow-list
+# change; `flask posts rerender` re-renders every row with an older version.
+RENDERER_VERSION = 1
+
+MARKDOWN_EXTENSIONS = ["fenced_code", "tables", "sane_lists"]
+
+ALLOWED_TAGS = [
+    "a", "abbr", "b", "blockquote", "br", "code", "em", "h1", "h2", "h3",
+    "h4", "h5", "h6", "hr", "i", "li", "ol", "p", "pre", "strong", "table",
+    "tbody", "td", "th", "thead", "tr", "ul",
+]
+ALLOWED_ATTRIBUTES = {
+    "a": ["href", "title", "rel"],
+    "abbr": ["title"],
+    "th": ["align"],
+    "td": ["align"],
+}
+ALLOWED_PROTOCOLS = ["http", "https", "mailto"]
+
+# A tag is lowercase letters, digits and inner hyphens.
+TAG_PATTERN = re.compile(r"[a-z0-9](?:[a-z0-9-]{0,30}[a-z0-9])?")
+MAX_TAGS = 5
+
+# Trending scores are measured from a fixed epoch so that a score never has to
+# change just because time passes; see `trending_score`.
+SCORE_EPOCH = datetime(2025, 1, 1)
+
+
+def render_markdown(text):
+    """
+    Renders Markdown text to sanitized HTML.
+
+    This function is pure (it needs no application context) so it can be run
+    in worker processes by the bulk re-render command.
+
+    Args:
+        text (str): The Markdown source.
+
+    Returns:
+        str: HTML that is safe to output without escaping.
+    """
+    html = markdown.markdown(text, extensions=MARKDOWN_EXTENSIONS)
+    html = bleach.clean(html, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES,
+                        protocols=ALLOWED_PROTOCOLS, strip=True)
+    return bleach.linkify(html, callbacks=[bleach.callbacks.nofollow])
+
+
+def render_content(obj):
+    """
+    Renders the `content` of a post or comment into its cached HTML column.
+
+    Call this whenever `content` is set so that page views never have to
+    invoke the Markdown engine.
+
+    Args:
+        obj (Post | Comment): The model instance to render.
+    """
+    obj.content_html = render_markdown(obj.content)
+    obj.render_version = RENDERER_VERSION
+
+
+def render_batch(rows):
+    """
+    Renders a batch of `(id, content)` pairs in a worker process.
+
+    Args:
+        rows (list): A list of `(id, content)` tuples.
+
+    Returns:
+        list: A list of dicts suitable for a bulk UPDATE by primary key.
+    """
+    return [
+        {"id": row_id, "content_html": render_markdown(content), "render_version": RENDERER_VERSION}
+        for row_id, content in rows
+    ]
+
+
+def trending_score(likes, comments, posted_at, half_life, like_weight=1.0, comment_weight=1.0):
+    """
+    Computes the time-decayed trending score of a post.
+
+    Engagement decays exponentially with the age of the post, halving every
+    `half_life` seconds. Rather than decaying every stored score as time
+    passes, the score is expressed relative to a fixed epoch:
+
+        log2(engagement) + (posted_at - epoch) / half_life
+
+    which orders posts exactly like `engagement * 2 ** (-age / half_life)` at
+    any moment. Only posts that gain likes or comments ever need rescoring.
+
+    Args:
+        likes (int): The number of likes on the post.
+        comments (int): The number of comments on the post.
+        posted_at (datetime): When the post was created.
+        half_life (float): The decay half-life in seconds.
+        like_weight (float): The weight of a single like.
+        comment_weight (float): The weight of a single comment.
+
+    Returns:
+        float: The score; higher is more popular.
+    """
+    engagement = 1 + like_weight * likes + comment_weight * comments
+    return math.log2(engagement) + (posted_at - SCORE_EPOCH).total_seconds() / half_life
+
+
+def queue_score_refresh(post_id):
+    """
+    Marks a post as touched so the next score refresh recomputes it.
+
+    This is a single upsert and is meant to run in the same transaction as
+    the write that touched the post.
+
+    Args:
+        post_id (int): The ID of the touched post.
+    """
+    upsert(PostScoreQueue, [{"post_id": post_id, "touched_at": datetime.utcnow()}],
+           index_elements=["post_id"], update_columns=["touched_at"])
+
+
+def parse_tags(text):
+    """
+    Splits tag input into normalized tag names.
+
+    Tags are separated by commas or whitespace, lowercased, stripped of a
+    leading "#" and deduplicated in order.
+
+    Args:
+        text (str): The tag input, possibly None.
+
+    Returns:
+        list: The tag names.
+    """
+    names = []
+    for name in re.split(r"[\s,]+", (text or "").lower()):
+        name = name.lstrip("#")
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def set_post_tags(post, names):
+    """
+    Replaces the tags of a post, writing only what changed.
+
+    The post's current tags are read with one query and diffed against
+    `names`. Missing tags are created with one `INSERT ... ON CONFLICT DO
+    NOTHING`; added and removed associations are written with one bulk
+    insert and one delete; and the `post_count` of the affected tags is
+    adjusted with one update per direction. Runs in the caller's transaction.
+
+    Args:
+        post (Post): The post, flushed so that it has an ID.
+        names (iterable): The normalized names of the post's new tags.
+    """
+    names = set(names)
+    current = dict(db.session.execute(
+        select(Tag.name, Tag.id).join(PostTag, PostTag.tag_id == Tag.id).where(PostTag.post_id == post.id)
+    ).all())
+
+    added = names - current.keys()
+    if added:
+        upsert(Tag, [{"name": name} for name in added], index_elements=["name"])
+        tag_ids = db.session.scalars(select(Tag.id).where(Tag.name.in_(added))).all()
+        db.session.execute(insert(PostTag), [
+            {"post_id": post.id, "tag_id": tag_id, "post_date": post.date} for tag_id in tag_ids
+        ])
+        db.session.execute(update(Tag).where(Tag.id.in_(tag_ids)).values(post_count=Tag.post_count + 1))
+
+    removed = [current[name] for name in current.keys() - names]
+    if removed:
+        db.session.execute(delete(PostTag).where(PostTag.post_id == post.id, PostTag.tag_id.in_(removed)))
+        db.session.execute(update(Tag).where(Tag.id.in_(removed)).values(post_count=Tag.post_count - 1))
+
+
+def comment_path(comment_id, parent_path=None):
+    """
+    Builds the materialized path of a comment.
+
+    A top-level comment's single segment is its inverted ID, so newer threads
+    sort first; a reply appends its own ID to its parent's path, so replies
+    sort oldest first below their parent.
+
+    Args:
+        comment_id (int): The ID of the comment.
+        parent_path (str): The path of the parent comment, or None.
+
+    Returns:
+        str: The path.
+    """
+    if parent_path is None:
+        return f"{0xFFFFFFFF - comment_id:08x}"
+    return f"{parent_path}{comment_id:08x}"
+
+
+def add_comment(post, author, content, parent=None):
+    """
+    Adds a comment, or a reply to another comment, to a post.
+
+    The comment is flushed to get its ID, from which its path is built.
+    Replies to comments at `Comment.MAX_DEPTH` become replies to their
+    parent instead, so threads never nest deeper. The post author's
+    `comments_received` is incremented in the same transaction.
+
+    Args:
+        post (Post): The post commented on.
+        author (User): The user writing the comment.
+        content (str): The Markdown source of the comment.
+        parent (Comment): The comment replied to, or None.
+
+    Returns:
+        Comment: The new comment.
+    """
+    parent_id = parent_path = None
+    if parent is not None:
+        parent_id, parent_path = parent.id, parent.path
+        if parent.depth + 1 >= Comment.MAX_DEPTH:
+            parent_id, parent_path = parent.parent_id, parent.path[:-Comment.PATH_SEGMENT_LENGTH]
+    comment = Comment(content=content, author=author, post_id=post.id, parent_id=parent_id, path="")
+    render_content(comment)
+    db.session.add(comment)
+    db.session.flush()
+    comment.path = comment_path(comment.id, parent_path)
+    queue_score_refresh(post.id)
+    adjust_user_stats(post.user_id, comments=1)
+    return comment
+
+
+def remove_post_stats(post):
+    """
+    Subtracts a post that is being deleted, with its likes and comments,
+    from its author's profile statistics. Must run before the post's
+    comments are deleted.
+
+    Args:
+        post (Post): The post being deleted.
+    """
+    comments = db.session.scalar(select(func.count()).select_from(Comment).where(Comment.post_id == post.id))
+    adjust_user_stats(post.user_id, posts=-1, likes=-post.like_count, comments=-comments)
+
+
+def comment_page_query(post_id, start="", per_page=20):
+    """
+    Builds the query for a page of a post's comment threads.
+
+    A page holds `per_page` top-level comments with all of their replies.
+    Ordered by path, that is one contiguous range of the `(post_id, path)`
+    index: from `start` up to the path of the next page's first top-level
+    comment, which a subquery finds and which is also selected with every row
+    as the cursor of the next page.
+
+    Args:
+        post_id (int): The ID of the post.
+        start (str): The path of the page's first top-level comment, or ""
+                     for the first page.
+        per_page (int): The number of top-level comments per page.
+
+    Returns:
+        Select: A statement selecting `(Comment, next_start)` rows in display
+        order, with their authors eager loaded.
+    """
+    next_start = (
+        select(Comment.path)
+        .where(Comment.post_id == post_id, Comment.parent_id.is_(None), Comment.path >= start)
+        .order_by(Comment.path)
+        .offset(per_page)
+        .limit(1)
+        .scalar_subquery()
+    )
+    return (
+        select(Comment, next_start.label("next_start"))
+        # "g" sorts after every hex path, so the last page runs to the end.
+        .where(Comment.post_id == post_id, Comment.path >= start,
+               Comment.path < func.coalesce(next_start, "g"))
+        .options(joinedload(Comment.author))
+        .order_by(Comment.path)
+    )
+
+
+def comment_page_start():
+    """
+    Returns the comment page cursor of the current request, or "" for the
+    first page if it is missing or malformed.
+    """
+    start = request.args.get("comments", "")
+    return start if re.fullmatch(r"[0-9a-f]{8}", start) else ""
+
+
+def comment_page(rows):
+    """
+    Splits the rows of a `comment_page_query` result.
+
+    Args:
+        rows (list): The `(Comment, next_start)` rows.
+
+    Returns:
+        tuple: `(comments, next_start)`; `next_start` is None on the last page.
+    """
+    return [row[0] for row in rows], rows[0][1] if rows else None
+
+
+def liked_query(user_id, post_id):
+    """
+    Builds a query telling whether a user likes a post.
+
+    The query is answered from the unique `(user_id, post_id)` like index
+    without loading the post's likes.
+
+    Args:
+        user_id (int): The ID of the user.
+        post_id (int): The ID of the post.
+
+    Returns:
+        Select: A statement selecting a single boolean.
+    """
+    return select(exists().where(Like.user_id == user_id, Like.post_id == post_id))
+
+
+def toggle_like(user_id, post_id):
+    """
+    Likes a post for a user, or removes the like if it already exists.
+
+    The like is deleted, or inserted when there was none, and the post's
+    `like_count` is adjusted with a single `UPDATE ... RETURNING`, which also
+    yields the new count and the author, whose `likes_received` is adjusted
+    too. Runs in the caller's transaction, which must be rolled back if None
+    is returned.
+
+    Args:
+        user_id (int): The ID of the user.
+        post_id (int): The ID of the post.
+
+    Returns:
+        tuple: `(liked, like_count)` after the toggle, or None if the post
+        does not exist or has been deleted.
+    """
+    removed = db.session.execute(
+        delete(Like).where(Like.user_id == user_id, Like.post_id == post_id)
+    ).rowcount
+    row = db.session.execute(
+        update(Post)
+        .where(Post.id == post_id, Post.deleted_at.is_(None))
+        .values(like_count=Post.like_count + (-1 if removed else 1))
+        .returning(Post.like_count, Post.user_id)
+    ).first()
+    if row is None:
+        return None
+    if not removed:
+        db.session.execute(insert(Like).values(user_id=user_id, post_id=post_id))
+    queue_score_refresh(post_id)
+    adjust_user_stats(row.user_id, likes=-1 if removed else 1)
+    return not removed, row.like_count
+
+
+def wants_json():
+    """
+    Tells whether the client prefers a JSON response to an HTML page.
+
+    Returns:
+        bool: True if the `Accept` header ranks JSON above HTML.
+    """
+    return request.accept_mimetypes.best_match(["text/html", "application/json"]) == "application/json"
+
+
+def post_channel(post_id):
+    """
+    Returns the name of the live event channel of a post.
+    """
+    return f"post:{post_id}"
+
+
+def publish_comment(comment):
+    """
+    Pushes a new comment, rendered as on the post page, to the post's live
+    event subscribers. Call it after the comment is committed.
+
+    Args:
+        comment (Comment): The new comment, with its author.
+    """
+    events.publish(post_channel(comment.post_id), "comment", {
+        "id": comment.id,
+        "html": render_template("includes/comment.html", comment=comment),
+    })
+
+
+def publish_likes(post_id, like_count):
+    """
+    Pushes a post's new like count to its live event subscribers. Call it
+    after the like is committed.
+
+    Args:
+        post_id (int): The ID of the post.
+        like_count (int): The number of likes after the change.
+    """
+    events.publish(post_channel(post_id), "likes", {"likes": like_count})
+
+
+def event_stream_response(stream):
+    """
+    Wraps SSE messages in a `text/event-stream` response that proxies
+    neither cache nor buffer.
+
+    Args:
+        stream: An iterator, or async iterator, of SSE messages.
+
+    Returns:
+        Response: The streaming response.
+    """
+    return Response(stream, mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def refresh_scores(batch_size=500):
+    """
+    Recomputes the trending score of every queued post.
+
+    The queue is drained in batches. Counts are aggregated only for the posts
+    in the batch, and a queue entry is removed only if the post was not
+    touched again while its score was being computed.
+
+    Args:
+        batch_size (int): The number of posts rescored per transaction.
+
+    Returns:
+        int: The number of posts rescored.
+    """
+    config = current_app.config
+    total = 0
+    last_id = 0
+    while True:
+        queued = db.session.execute(
+            select(PostScoreQueue.post_id, PostScoreQueue.touched_at)
+            .where(PostScoreQueue.post_id > last_id)
+            .order_by(PostScoreQueue.post_id)
+            .limit(batch_size)
+        ).all()
+        if not queued:
+            return total
+        last_id = queued[-1].post_id
+        post_ids = [row.post_id for row in queued]
+
+        likes = dict(db.session.execute(
+            select(Like.post_id, func.count())
+            .where(Like.post_id.in_(post_ids))
+            .group_by(Like.post_id)
+        ).all())
+        comments = dict(db.session.execute(
+            select(Comment.post_id, func.count())
+            .where(Comment.post_id.in_(post_ids))
+            .group_by(Comment.post_id)
+        ).all())
+        posts = db.session.execute(select(Post.id, Post.date).where(Post.id.in_(post_ids))).all()
+
+        now = datetime.utcnow()
+        upsert(PostScore, [
+            {
+                "post_id": post.id,
+                "score": trending_score(
+                    likes.get(post.id, 0), comments.get(post.id, 0), post.date,
+                    config["TRENDING_HALF_LIFE"], config["TRENDING_LIKE_WEIGHT"],
+                    config["TRENDING_COMMENT_WEIGHT"],
+                ),
+                "likes": likes.get(post.id, 0),
+                "comments": comments.get(post.id, 0),
+                "refreshed_at": now,
+            }
+            for post in posts
+        ], index_elements=["post_id"], update_columns=["score", "likes", "comments", "refreshed_at"])
+
+        # Compared with <= rather than for equality: timestamps written by the
+        # database, without fractional seconds, don't round-trip exactly.
+        queue = PostScoreQueue.__table__
+        db.session.execute(
+            queue.delete().where(queue.c.post_id == bindparam("queued_id"),
+                                 queue.c.touched_at <= bindparam("seen")),
+            [{"queued_id": row.post_id, "seen": row.touched_at} for row in queued],
+        )
+        db.session.commit()
+        total += len(posts)
+
+
+def _post_child_tables():
+    """
+    Lists every table with a foreign key to `post.id`.
+
+    Tables are returned children-first so that rows referencing other child
+    rows are removed before the rows they reference.
+
+    Returns:
+        list: `(table, column)` pairs, where `column` references `post.id`.
+    """
+    children = []
+    for table in reversed(db.metadata.sorted_tables):
+        for fk in table.foreign_keys:
+            if fk.column is Post.__table__.c.id:
+                children.append((table, fk.parent))
+    return children
+
+
+def purge_deleted_posts(batch_size=500):
+    """
+    Permanently removes soft-deleted posts and everything that references them.
+
+    Child rows are deleted in batches of at most `batch_size` rows, each in
+    its own short transaction, so purging a popular post never holds the
+    write lock for long. The post row itself is deleted last.
+
+    Args:
+        batch_size (int): The maximum number of rows deleted per statement.
+
+    Returns:
+        int: The number of posts purged.
+    """
+    children = _post_child_tables()
+    purged = 0
+    while True:
+        post_ids = db.session.scalars(
+            select(Post.id).where(Post.deleted_at.is_not(None)).order_by(Post.deleted_at).limit(batch_size)
+        ).all()
+        if not post_ids:
+            return purged
+        for post_id in post_ids:
+            for table, column in children:
+                key = tuple_(*table.primary_key.columns)
+                while True:
+                    doomed = select(*table.primary_key.columns).where(column == post_id).limit(batch_size)
+                    result = db.session.execute(delete(table).where(key.in_(doomed)))
+                    db.session.commit()
+                    if result.rowcount < batch_size:
+                        break
+            db.session.execute(delete(Post.__table__).where(Post.id == post_id))
+            db.session.commit()
+            purged += 1
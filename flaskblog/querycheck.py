@@ -0,0 +1,149 @@
+import re
+import sys
+from collections import namedtuple
+from contextlib import contextmanager
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event, select, text
+
+from flaskblog import db
+
+PlanProblem = namedtuple("PlanProblem", ["statement", "table", "rows", "detail"])
+
+# A full table scan: "SCAN post" or "SCAN post AS p". Scans that walk an
+# index ("SCAN post USING INDEX ix_post_date") are ordered reads and are fine.
+_FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+
+
+class QueryPlanChecker:
+    """
+    Captures SQL statements and flags the ones that scan large tables.
+
+    Use `capture()` around the code under test (typically test client
+    requests), then call `check()`. Every captured statement is run through
+    `EXPLAIN QUERY PLAN`; a statement is a problem when its plan contains a
+    full scan of a table holding at least `min_rows` rows. Only SQLite plans
+    are understood.
+
+    Example:
+        checker = QueryPlanChecker(db.engine)
+        with checker.capture():
+            client.get("/")
+        problems = checker.check()
+    """
+
+    def __init__(self, engine, min_rows=1000):
+        self.engine = engine
+        self.min_rows = min_rows
+        self.statements = {}
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+            if executemany:
+                parameters = parameters[0] if parameters else ()
+            self.statements.setdefault(statement, parameters)
+
+    @contextmanager
+    def capture(self):
+        """
+        Records every statement executed on the engine inside the block.
+        """
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        try:
+            yield self
+        finally:
+            event.remove(self.engine, "before_cursor_execute", self._record)
+
+    def check(self):
+        """
+        Explains every captured statement and reports unindexed scans.
+
+        Returns:
+            list: A `PlanProblem` for every full scan of a large table.
+        """
+        if self.engine.dialect.name != "sqlite":
+            raise RuntimeError("Query plan checks are only supported on SQLite.")
+
+        problems = []
+        with self.engine.connect() as connection:
+            row_counts = {}
+            for statement, parameters in self.statements.items():
+                plan = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+                for row in plan:
+                    detail = row[-1]
+                    match = _FULL_SCAN.match(detail)
+                    if not match or match.group(1) not in db.metadata.tables:
+                        continue
+                    table = match.group(1)
+                    if table not in row_counts:
+                        row_counts[table] = connection.scalar(
+                            select(text("count(*)")).select_from(db.metadata.tables[table])
+                        )
+                    if row_counts[table] >= self.min_rows:
+                        problems.append(PlanProblem(statement, table, row_counts[table], detail))
+        return problems
+
+
+def _sample_urls():
+    """
+    Builds the default set of read routes to check from existing data.
+
+    Returns:
+        list: URLs of the home, popular, post, profile, feed, tag and archive
+              pages.
+    """
+    from flaskblog.models import Post, Tag
+
+    urls = ["/", "/home?page=2", "/popular"]
+    post = Post.visible().order_by(Post.id.desc()).first()
+    if post is not None:
+        urls += [f"/post/{post.id}", f"/user/{post.author.username}", "/feed",
+                 f"/archive/{post.date.year}/{post.date.month}"]
+    tag = Tag.query.order_by(Tag.post_count.desc()).first()
+    if tag is not None:
+        urls.append(f"/tag/{tag.name}")
+    return urls
+
+
+@click.command("check-query-plans")
+@click.option("--url", "urls", multiple=True, help="A URL to request (repeatable). Defaults to the main read routes.")
+@click.option("--min-rows", type=int, default=1000, show_default=True,
+              help="Only report scans of tables with at least this many rows.")
+@click.option("--as-user", "username", default=None,
+              help="Request the pages logged in as this user (defaults to the author of the latest post).")
+@with_appcontext
+def check_query_plans(urls, min_rows, username):
+    """
+    Requests pages through the test client and explains every SQL statement
+    they issue, failing if any statement scans a large table without an index.
+    """
+    from flaskblog.models import Post, User
+
+    app = current_app._get_current_object()
+    urls = urls or _sample_urls()
+    if username:
+        user = User.query.filter_by(username=username).first()
+    else:
+        latest = Post.visible().order_by(Post.id.desc()).first()
+        user = latest.author if latest else None
+
+    checker = QueryPlanChecker(db.engine, min_rows=min_rows)
+    client = app.test_client()
+    if user is not None:
+        with client.session_transaction() as session:
+            session["_user_id"] = str(user.id)
+            session["_fresh"] = True
+
+    with checker.capture():
+        for url in urls:
+            response = client.get(url)
+            click.echo(f"{response.status_code} {url}")
+
+    problems = checker.check()
+    for problem in problems:
+        click.echo(f"\n{problem.detail} ({problem.rows} rows):\n    {problem.statement}")
+    click.echo(f"\nChecked {len(checker.statements)} statement(s); {len(problems)} problem(s).")
+    if problems:
+        sys.exit(1)
@@ -0,0 +1,285 @@
+import math
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlparse
+
+from flask import current_app, request
+from flask_login import current_user
+from werkzeug.exceptions import TooManyRequests
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+def parse_limit(limit):
+    """
+    Parses a limit such as "10/minute" into token bucket parameters.
+
+    The bucket holds up to N tokens and refills at N tokens per period, so a
+    client may burst N requests and then continue at the average rate.
+
+    Args:
+        limit (str): "<count>/<second|minute|hour|day>".
+
+    Returns:
+        tuple: `(capacity, refill_rate)` with the rate in tokens per second.
+    """
+    count, _, period = limit.partition("/")
+    capacity = int(count)
+    return capacity, capacity / _PERIODS[period.strip().rstrip("s")]
+
+
+def _take(tokens, updated, now, capacity, rate):
+    """
+    Refills a bucket for the elapsed time and tries to take one token.
+
+    Returns:
+        tuple: `(tokens_left, retry_after)`; `retry_after` is 0 when allowed.
+    """
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0
+    return tokens, (1 - tokens) / rate
+
+
+class MemoryBackend:
+    """
+    Keeps buckets in process memory. Limits are per worker process.
+
+    The least recently used buckets are dropped once `max_keys` is reached;
+    an idle bucket is full anyway, so forgetting it is harmless.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens, retry_after = _take(tokens, updated, now, capacity, rate)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+    def refund(self, key, capacity):
+        with self._lock:
+            if key in self._buckets:
+                tokens, updated = self._buckets[key]
+                self._buckets[key] = (min(capacity, tokens + 1), updated)
+
+
+class SQLiteBackend:
+    """
+    Keeps buckets in a SQLite file shared by every process on the host.
+
+    Each check is one primary key read and one write inside an immediate
+    transaction, so concurrent workers never lose updates.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS bucket (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._local.connection = connection
+        return connection
+
+    def take(self, key, capacity, rate):
+        connection = self._connection()
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT tokens, updated FROM bucket WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens, retry_after = _take(tokens, updated, now, capacity, rate)
+            connection.execute("INSERT OR REPLACE INTO bucket (key, tokens, updated) VALUES (?, ?, ?)",
+                               (key, tokens, now))
+            # Occasionally forget buckets idle for a day; they would be full.
+            if random.random() < 0.001:
+                connection.execute("DELETE FROM bucket WHERE updated < ?", (now - 86400,))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return retry_after
+
+    def refund(self, key, capacity):
+        self._connection().execute("UPDATE bucket SET tokens = MIN(?, tokens + 1) WHERE key = ?", (capacity, key))
+
+
+class RedisBackend:
+    """
+    Keeps buckets in Redis (or any server speaking the Redis protocol) so
+    limits are shared by every node. Requires the `redis` package.
+
+    Each check is a single atomic script call.
+    """
+
+    SCRIPT = """
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + (now - updated) * rate)
+    local retry_after = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        retry_after = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+    redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+    return tostring(retry_after)
+    """
+
+    REFUND_SCRIPT = """
+    local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens'))
+    if tokens then
+        redis.call('HSET', KEYS[1], 'tokens', tostring(math.min(tonumber(ARGV[1]), tokens + 1)))
+    end
+    """
+
+    def __init__(self, url):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+        self._refund_script = self._client.register_script(self.REFUND_SCRIPT)
+
+    def take(self, key, capacity, rate):
+        return float(self._script(keys=[f"ratelimit:{key}"], args=[capacity, rate, time.time()]))
+
+    def refund(self, key, capacity):
+        self._refund_script(keys=[f"ratelimit:{key}"], args=[capacity])
+
+
+def create_backend(url, instance_path=""):
+    """
+    Creates a rate limit backend from a URL.
+
+    Args:
+        url (str): "memory://", "sqlite:///relative/or/absolute/path.db" or
+                   "redis://host:port/db". Relative SQLite paths are resolved
+                   against the instance folder.
+        instance_path (str): The application's instance folder.
+
+    Returns:
+        object: A backend with `take(key, capacity, rate)` and
+                `refund(key, capacity)` methods.
+    """
+    scheme = urlparse(url).scheme
+    if scheme == "memory":
+        return MemoryBackend()
+    if scheme == "sqlite":
+        path = url[len("sqlite:///"):]
+        if not path.startswith("/"):
+            path = f"{instance_path}/{path}"
+        return SQLiteBackend(path)
+    if scheme in ("redis", "rediss", "unix"):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported RATELIMIT_STORAGE_URL: {url}")
+
+
+class RateLimiter:
+    """
+    Token bucket rate limiting for individual endpoints.
+
+    Views opt in with the `limit` decorator; the limits themselves come from
+    the `RATELIMITS` setting, keyed by endpoint name:
+
+        RATELIMITS = {
+            "users.login": {"ip": "10/minute"},
+            "posts.like_post": {"ip": "120/minute", "user": "60/minute"},
+        }
+
+    Each endpoint may have a per-IP bucket, a per-user bucket (used only for
+    authenticated users) and a `methods` list (POST by default). A request
+    over any limit is rejected with 429 Too Many Requests and a
+    `Retry-After` header.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Configures the limiter's storage backend for an application.
+
+        Args:
+            app (Flask): The application.
+        """
+        app.config.setdefault("RATELIMIT_ENABLED", True)
+        app.config.setdefault("RATELIMIT_STORAGE_URL", "memory://")
+        app.config.setdefault("RATELIMITS", {})
+        self.backend = create_backend(app.config["RATELIMIT_STORAGE_URL"], app.instance_path)
+        app.extensions["rate_limiter"] = self
+
+    def check(self, endpoint):
+        """
+        Takes a token from every bucket configured for an endpoint.
+
+        The request is charged all or nothing: when any bucket is empty, the
+        tokens already taken from the other buckets are given back, so a
+        rejected request does not use up the rest of its limits.
+
+        Args:
+            endpoint (str): The endpoint name.
+
+        Raises:
+            TooManyRequests: If any bucket is empty.
+        """
+        config = current_app.config
+        rules = config["RATELIMITS"].get(endpoint)
+        if not config["RATELIMIT_ENABLED"] or not rules:
+            return
+        if request.method not in rules.get("methods", ("POST",)):
+            return
+
+        identities = {"ip": request.remote_addr or "unknown"}
+        if current_user.is_authenticated:
+            identities["user"] = current_user.get_id()
+
+        retry_after = 0
+        taken = []
+        for scope in ("ip", "user"):
+            if scope not in rules or scope not in identities:
+                continue
+            capacity, rate = parse_limit(rules[scope])
+            key = f"{endpoint}:{scope}:{identities[scope]}"
+            wait = self.backend.take(key, capacity, rate)
+            if wait:
+                retry_after = max(retry_after, wait)
+            else:
+                taken.append((key, capacity))
+        if retry_after:
+            for key, capacity in taken:
+                self.backend.refund(key, capacity)
+            raise TooManyRequests(retry_after=math.ceil(retry_after))
+
+    def limit(self, view):
+        """
+        Decorates a view so its requests are checked against `RATELIMITS`.
+        """
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            self.check(request.endpoint)
+            return view(*args, **kwargs)
+        return wrapper
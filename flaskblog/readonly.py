@@ -0,0 +1,380 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import click
+from flask import current_app, g, request, session, Response
+from flask.cli import AppGroup
+from flask_login.config import COOKIE_NAME
+from sqlalchemy import select
+from sqlalchemy.exc import InterfaceError, OperationalError, TimeoutError
+from werkzeug.exceptions import ServiceUnavailable
+
+logger = logging.getLogger(__name__)
+
+# Set on requests made by the snapshot job, which must reach the real views.
+SNAPSHOT_ENVIRON_KEY = "flaskblog.snapshot"
+
+read_only_cli = AppGroup("read-only", help="Switch read-only mode and refresh the page snapshots.")
+
+
+class CircuitBreaker:
+    """
+    Trips after repeated database failures so requests stop waiting on a
+    database that is down or locked.
+
+    The breaker opens once `threshold` failures happen within `window`
+    seconds. While open, `retry_after` tells how long until it lets a single
+    request through to probe the database; the probe closes the breaker if
+    it succeeds and reopens it if it fails. State is per process.
+    """
+
+    def __init__(self, threshold=5, window=10, cooldown=30):
+        self.threshold = threshold
+        self.window = window
+        self.cooldown = cooldown
+        self._failures = deque()
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def record_failure(self):
+        now = time.monotonic()
+        with self._lock:
+            self._probing = False
+            if self._opened_at is not None:
+                self._opened_at = now
+                return
+            self._failures.append(now)
+            while self._failures and self._failures[0] < now - self.window:
+                self._failures.popleft()
+            if len(self._failures) >= self.threshold:
+                self._failures.clear()
+                self._opened_at = now
+                logger.warning("Database circuit breaker opened; serving read-only for %ds", self.cooldown)
+
+    def record_success(self):
+        with self._lock:
+            if self._probing:
+                logger.info("Database circuit breaker closed")
+                self._opened_at = None
+            self._probing = False
+
+    def try_probe(self):
+        """
+        Claims the one request allowed through after the cooldown.
+
+        Returns:
+            bool: True if the caller's request is the probe.
+        """
+        with self._lock:
+            if self._opened_at is None or self._probing:
+                return False
+            if time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            self._probing = True
+            return True
+
+    def retry_after(self):
+        """
+        Returns the seconds until the breaker lets a probe through, at least 1.
+        """
+        opened_at = self._opened_at
+        if opened_at is None:
+            return 0
+        return max(1, int(self.cooldown - (time.monotonic() - opened_at)) + 1)
+
+
+class ReadOnlyMode:
+    """
+    Keeps the site readable while the database is down or being migrated.
+
+    Read-only mode is on while the `READ_ONLY_FLAG` file exists (switched
+    with `flask read-only on|off`, and held by `flask db upgrade` while
+    migrations run) or while the circuit breaker is open after repeated
+    database errors. In this mode:
+
+    - Anonymous GET requests for `SNAPSHOT_ENDPOINTS` (the home, post and
+      user pages) are answered from the on-disk snapshots written by
+      `flask read-only snapshot`, without touching the database.
+    - Requests that change data get 503 Service Unavailable with a
+      `Retry-After` header right away instead of waiting on database locks.
+    - Other reads run as usual when the mode was switched on by hand, and
+      get 503 as well while the breaker is open.
+
+    Snapshots are rendered through the test client in a throwaway session,
+    never captured from visitors' responses, so they hold no visitor's
+    session data or CSRF token.
+    """
+
+    def __init__(self, app=None):
+        self.breaker = None
+        self.flag_path = None
+        self.snapshot_dir = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Registers the request hooks and database error handlers on an application.
+
+        Args:
+            app (Flask): The application.
+        """
+        config = app.config
+        config.setdefault("READ_ONLY_FLAG", "read_only")
+        config.setdefault("READ_ONLY_RETRY_AFTER", 60)
+        config.setdefault("CIRCUIT_BREAKER_THRESHOLD", 5)
+        config.setdefault("CIRCUIT_BREAKER_WINDOW", 10)
+        config.setdefault("CIRCUIT_BREAKER_COOLDOWN", 30)
+        config.setdefault("SNAPSHOT_DIR", "snapshots")
+        config.setdefault("SNAPSHOT_ENDPOINTS", ("main.home", "posts.post", "users.user_posts"))
+        config.setdefault("SNAPSHOT_HOME_PAGES", 5)
+        config.setdefault("SNAPSHOT_POSTS", 200)
+        self.breaker = CircuitBreaker(config["CIRCUIT_BREAKER_THRESHOLD"], config["CIRCUIT_BREAKER_WINDOW"],
+                                      config["CIRCUIT_BREAKER_COOLDOWN"])
+        self.flag_path = os.path.join(app.instance_path, config["READ_ONLY_FLAG"])
+        self.snapshot_dir = os.path.join(app.instance_path, config["SNAPSHOT_DIR"])
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+        for error in (OperationalError, InterfaceError, TimeoutError):
+            app.register_error_handler(error, self._handle_database_error)
+        app.extensions["read_only"] = self
+
+    # Switch
+
+    @property
+    def switched_on(self):
+        """
+        True while the read-only flag file exists.
+        """
+        return os.path.exists(self.flag_path)
+
+    def switch(self, on):
+        """
+        Turns the read-only flag on or off for every process on the host.
+
+        Args:
+            on (bool): Whether to turn read-only mode on.
+        """
+        if on:
+            os.makedirs(os.path.dirname(self.flag_path), exist_ok=True)
+            with open(self.flag_path, "w") as flag:
+                flag.write(f"{os.getpid()}\n")
+        elif os.path.exists(self.flag_path):
+            os.remove(self.flag_path)
+
+    @contextmanager
+    def engaged(self):
+        """
+        Holds read-only mode on for the duration of a block, such as a
+        migration, unless it was already on.
+        """
+        if self.switched_on:
+            yield
+            return
+        self.switch(True)
+        try:
+            yield
+        finally:
+            self.switch(False)
+
+    def retry_after(self):
+        """
+        Returns the `Retry-After` seconds while read-only, or 0 otherwise.
+        """
+        if self.breaker.is_open:
+            return self.breaker.retry_after()
+        if self.switched_on:
+            return current_app.config["READ_ONLY_RETRY_AFTER"]
+        return 0
+
+    # Snapshots
+
+    def snapshot_path(self, url):
+        """
+        Returns the file holding the snapshot of a URL path and query string.
+        """
+        return os.path.join(self.snapshot_dir, hashlib.sha1(url.encode()).hexdigest() + ".html")
+
+    def write_snapshot(self, url, body):
+        """
+        Atomically replaces the snapshot of a URL.
+
+        Args:
+            url (str): The path and query string, such as "/home?page=2".
+            body (bytes): The rendered page.
+        """
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        path = self.snapshot_path(url)
+        temp = f"{path}.{os.getpid()}.tmp"
+        with open(temp, "wb") as snapshot:
+            snapshot.write(body)
+        os.replace(temp, path)
+
+    def discard_snapshot(self, url):
+        """
+        Removes the snapshot of a URL, for example of a deleted post.
+        """
+        try:
+            os.remove(self.snapshot_path(url))
+        except FileNotFoundError:
+            pass
+
+    def _snapshot_response(self):
+        """
+        Returns the snapshot answering the current request, or None.
+        """
+        if request.method not in ("GET", "HEAD") or request.endpoint not in current_app.config["SNAPSHOT_ENDPOINTS"]:
+            return None
+        # Checked without `current_user`, which would load the user from the database.
+        if "_user_id" in session or request.cookies.get(current_app.config.get("REMEMBER_COOKIE_NAME", COOKIE_NAME)):
+            return None
+        path = self.snapshot_path(request.full_path.rstrip("?"))
+        try:
+            with open(path, "rb") as snapshot:
+                body = snapshot.read()
+            modified = os.path.getmtime(path)
+        except OSError:
+            return None
+        response = Response(body, mimetype="text/html")
+        response.last_modified = modified
+        response.cache_control.no_cache = True
+        response.headers["X-Read-Only"] = "1"
+        return response
+
+    def _unavailable(self):
+        """
+        Returns the 503 error for a request refused while read-only.
+        """
+        return ServiceUnavailable(
+            "The site is read-only for a moment. Please try again shortly.",
+            retry_after=self.retry_after() or current_app.config["READ_ONLY_RETRY_AFTER"],
+        )
+
+    # Hooks
+
+    def _before_request(self):
+        if request.endpoint == "static" or request.environ.get(SNAPSHOT_ENVIRON_KEY):
+            return None
+        if self.breaker.try_probe():
+            g.circuit_probe = True
+            return None
+        if not self.retry_after():
+            return None
+        response = self._snapshot_response()
+        if response is not None:
+            return response
+        if request.method in ("GET", "HEAD", "OPTIONS") and not self.breaker.is_open:
+            return None
+        raise self._unavailable()
+
+    def _teardown_request(self, error):
+        if g.pop("circuit_probe", False) and not g.get("database_failed"):
+            self.breaker.record_success()
+
+    def _handle_database_error(self, error):
+        logger.error("Database error: %s", error)
+        g.database_failed = True
+        self.breaker.record_failure()
+        response = self._snapshot_response()
+        if response is not None:
+            return response
+        return current_app.handle_http_exception(self._unavailable())
+
+
+def _snapshot_urls(config):
+    """
+    Returns the URLs to snapshot: the first home pages, the newest posts and
+    the pages of their authors.
+    """
+    from flaskblog import db
+    from flaskblog.models import Post, User
+
+    urls = ["/"] + [f"/home?page={page}" for page in range(2, config["SNAPSHOT_HOME_PAGES"] + 1)]
+    posts = db.session.execute(
+        select(Post.id, Post.user_id)
+        .where(Post.deleted_at.is_(None))
+        .order_by(Post.date.desc())
+        .limit(config["SNAPSHOT_POSTS"])
+    ).all()
+    urls += [f"/post/{post.id}" for post in posts]
+    author_ids = {post.user_id for post in posts}
+    if author_ids:
+        usernames = db.session.scalars(select(User.username).where(User.id.in_(author_ids))).all()
+        urls += [f"/user/{username}" for username in sorted(usernames)]
+    return urls
+
+
+def refresh_snapshots():
+    """
+    Renders the anonymous home, post and user pages into the snapshot folder.
+
+    Covers the first `SNAPSHOT_HOME_PAGES` home pages and the newest
+    `SNAPSHOT_POSTS` posts with their authors' pages. Pages that fail to
+    render keep their previous snapshot.
+
+    Returns:
+        int: The number of snapshots written.
+    """
+    app = current_app._get_current_object()
+    read_only = app.extensions["read_only"]
+    client = app.test_client()
+    written = 0
+    for url in _snapshot_urls(app.config):
+        response = client.get(url, environ_overrides={SNAPSHOT_ENVIRON_KEY: True})
+        if response.status_code == 200:
+            read_only.write_snapshot(url, response.get_data())
+            written += 1
+    return written
+
+
+@read_only_cli.command("on")
+def read_only_on():
+    """
+    Turns read-only mode on for every worker on this host.
+    """
+    current_app.extensions["read_only"].switch(True)
+    click.echo("Read-only mode is on.")
+
+
+@read_only_cli.command("off")
+def read_only_off():
+    """
+    Turns read-only mode off.
+    """
+    current_app.extensions["read_only"].switch(False)
+    click.echo("Read-only mode is off.")
+
+
+@read_only_cli.command("status")
+def read_only_status():
+    """
+    Tells whether read-only mode is switched on.
+    """
+    click.echo(f"Read-only mode is {'on' if current_app.extensions['read_only'].switched_on else 'off'}.")
+
+
+@read_only_cli.command("snapshot")
+@click.option("--interval", type=int, default=None,
+              help="Keep running, refreshing every INTERVAL seconds, instead of exiting after one pass.")
+def snapshot_command(interval):
+    """
+    Refreshes the page snapshots served while the site is read-only.
+
+    Schedule this from cron, or run it with --interval as a long-lived
+    process.
+    """
+    while True:
+        click.echo(f"Wrote {refresh_snapshots()} snapshot(s).")
+        if interval is None:
+            return
+        time.sleep(interval)
@@ -0,0 +1,322 @@
+import errno
+import gc
+import logging
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from werkzeug.serving import make_server
+
+from flaskblog import db, view_counter
+
+logger = logging.getLogger(__name__)
+
+# Set on the command line of a re-executed master: the inherited listening
+# socket and the workers of the previous generation.
+LISTEN_FD_ENV = "FLASKBLOG_LISTEN_FD"
+OLD_WORKERS_ENV = "FLASKBLOG_OLD_WORKERS"
+# Set when the master only checks that the new code loads before a reload.
+CHECK_ENV = "FLASKBLOG_SERVE_CHECK"
+
+
+def _rss_bytes():
+    """
+    Returns the resident set size of the current process, or 0 if unknown.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    # Peak rather than current RSS; kilobytes on Linux, bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class PreforkServer:
+    """
+    Serves a preloaded WSGI application from a pool of forked worker processes.
+
+    The master binds the listening socket and loads the app once; workers are
+    forked from it, so the app's code and read-only data are shared between
+    them copy-on-write. Every worker accepts connections from the shared
+    socket and handles one request at a time.
+
+    A worker is replaced after `max_requests` requests (plus up to
+    `max_requests_jitter`, so workers do not all restart together) or once
+    its resident memory exceeds `max_rss` bytes; 0 disables either limit.
+
+    Signals sent to the master:
+        SIGTERM, SIGINT  Graceful shutdown. Workers finish their current
+                         request; any still running after `graceful_timeout`
+                         seconds are killed.
+        SIGHUP           Zero-downtime reload. The master re-executes itself,
+                         keeping the listening socket, loads the new code,
+                         forks new workers and then gracefully stops the old
+                         ones. A reload whose code fails to load is skipped.
+
+    Args:
+        app (Flask): The application to serve.
+        host (str): The interface to bind.
+        port (int): The port to bind.
+        workers (int): The number of worker processes.
+        max_requests (int): Requests after which a worker is replaced.
+        max_requests_jitter (int): Random extra requests per worker.
+        max_rss (int): Resident memory in bytes after which a worker is replaced.
+        graceful_timeout (int): Seconds workers get to finish on shutdown.
+    """
+
+    def __init__(self, app, host="127.0.0.1", port=5000, workers=2, max_requests=0,
+                 max_requests_jitter=0, max_rss=0, graceful_timeout=30):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.max_rss = max_rss
+        self.graceful_timeout = graceful_timeout
+        self.socket = None
+        self._children = set()
+        self._old_children = set()
+        self._signal = None
+
+    # Master
+
+    def run(self):
+        """
+        Starts the workers and supervises them until shutdown.
+        """
+        self.socket = self._listen()
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(sig, self._handle_signal)
+
+        # Connections must not be inherited by workers, and objects created
+        # while loading the app are never collected; keeping the collector off
+        # them avoids touching (and so copying) their pages in every worker.
+        with self.app.app_context():
+            db.engine.dispose()
+        gc.freeze()
+
+        self._spawn_workers()
+        old = os.environ.pop(OLD_WORKERS_ENV, "")
+        self._old_children = {int(pid) for pid in old.split(",") if pid}
+        for pid in self._old_children:
+            self._kill(pid, signal.SIGTERM)
+        logger.info("Listening on http://%s:%s with %d workers", self.host, self.port, self.workers)
+
+        try:
+            while True:
+                self._reap()
+                if self._signal in (signal.SIGTERM, signal.SIGINT):
+                    break
+                if self._signal == signal.SIGHUP:
+                    self._signal = None
+                    self._reload()
+                self._spawn_workers()
+                time.sleep(0.5)
+        finally:
+            self._stop_workers()
+            self.socket.close()
+
+    def _listen(self):
+        fd = os.environ.pop(LISTEN_FD_ENV, None)
+        if fd is not None:
+            sock = socket.socket(fileno=int(fd))
+        else:
+            sock = socket.create_server((self.host, self.port), backlog=2048)
+        # Workers race to accept; the losers must not block in accept().
+        sock.setblocking(False)
+        return sock
+
+    def _handle_signal(self, signum, frame):
+        self._signal = signum
+
+    def _spawn_workers(self):
+        while len(self._children) < self.workers:
+            pid = os.fork()
+            if pid == 0:
+                self._run_worker()
+            self._children.add(pid)
+            logger.info("Booted worker %d", pid)
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            self._children.discard(pid)
+            self._old_children.discard(pid)
+            if os.waitstatus_to_exitcode(status) != 0:
+                logger.warning("Worker %d exited with status %d", pid, os.waitstatus_to_exitcode(status))
+
+    def _kill(self, pid, sig):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            self._children.discard(pid)
+            self._old_children.discard(pid)
+
+    def _stop_workers(self):
+        for pid in self._children | self._old_children:
+            self._kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout
+        while (self._children or self._old_children) and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in self._children | self._old_children:
+            logger.warning("Killing worker %d after the graceful timeout", pid)
+            self._kill(pid, signal.SIGKILL)
+        while self._children or self._old_children:
+            try:
+                pid, _ = os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+            self._children.discard(pid)
+            self._old_children.discard(pid)
+
+    def _reload(self):
+        """
+        Re-executes the master with the same command line and socket.
+
+        The current workers keep serving; they are children of the same
+        process after `exec`, and the new master stops them once its own
+        workers are running.
+        """
+        argv = sys.orig_argv
+        check = subprocess.run([sys.executable, *argv[1:]], env={**os.environ, CHECK_ENV: "1"})
+        if check.returncode != 0:
+            logger.error("Not reloading: the application failed to load")
+            return
+
+        logger.info("Reloading")
+        os.set_inheritable(self.socket.fileno(), True)
+        env = dict(os.environ)
+        env[LISTEN_FD_ENV] = str(self.socket.fileno())
+        env[OLD_WORKERS_ENV] = ",".join(str(pid) for pid in self._children | self._old_children)
+        logging.shutdown()
+        os.execve(sys.executable, argv, env)
+
+    # Worker
+
+    def _run_worker(self):
+        """
+        Serves requests in a freshly forked worker; never returns.
+        """
+        status = 0
+        try:
+            status = self._serve()
+        except BaseException:
+            logger.exception("Worker %d failed", os.getpid())
+            status = 1
+        finally:
+            os._exit(status)
+
+    def _serve(self):
+        state = {"alive": True, "requests": 0}
+
+        def stop(signum, frame):
+            state["alive"] = False
+
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGQUIT):
+            signal.signal(sig, stop)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+        # Pooled connections belong to the master; drop them without closing.
+        with self.app.app_context():
+            db.engine.dispose(close=False)
+
+        app = self.app
+
+        def counting_app(environ, start_response):
+            state["requests"] += 1
+            return app(environ, start_response)
+
+        max_requests = self.max_requests
+        if max_requests:
+            max_requests += random.randint(0, self.max_requests_jitter)
+
+        server = make_server(self.host, self.port, counting_app, fd=self.socket.fileno())
+        server.timeout = 1
+        try:
+            while state["alive"]:
+                try:
+                    server.handle_request()
+                except OSError as e:
+                    if e.errno != errno.EINTR:
+                        raise
+                if max_requests and state["requests"] >= max_requests:
+                    logger.info("Worker %d served %d requests; restarting", os.getpid(), state["requests"])
+                    break
+                if self.max_rss and _rss_bytes() > self.max_rss:
+                    logger.info("Worker %d exceeded the memory limit; restarting", os.getpid())
+                    break
+        finally:
+            server.server_close()
+            view_counter.flush()
+            with app.app_context():
+                db.engine.dispose()
+        return 0
+
+
+@click.command("serve")
+@click.option("--host", "-h", default="127.0.0.1", show_default=True, help="The interface to bind.")
+@click.option("--port", "-p", type=int, default=5000, show_default=True, help="The port to bind.")
+@click.option("--workers", "-w", type=int, default=None, help="Worker processes [default: SERVE_WORKERS].")
+@click.option("--max-requests", type=int, default=None,
+              help="Replace a worker after this many requests, 0 to disable [default: SERVE_MAX_REQUESTS].")
+@click.option("--max-requests-jitter", type=int, default=None,
+              help="Random extra requests per worker [default: SERVE_MAX_REQUESTS_JITTER].")
+@click.option("--max-rss", type=int, default=None,
+              help="Replace a worker above this many MiB of memory, 0 to disable [default: SERVE_MAX_RSS_MB].")
+@click.option("--graceful-timeout", type=int, default=None,
+              help="Seconds workers get to finish on shutdown [default: SERVE_GRACEFUL_TIMEOUT].")
+@with_appcontext
+def serve(host, port, workers, max_requests, max_requests_jitter, max_rss, graceful_timeout):
+    """
+    Serves the application from preforked worker processes.
+
+    Send SIGHUP to reload the code without dropping connections, and SIGTERM
+    to shut down gracefully.
+    """
+    if os.environ.get(CHECK_ENV):
+        return
+    if not hasattr(os, "fork"):
+        raise click.UsageError("flask serve needs a platform with fork(); use flask run instead.")
+
+    app = current_app._get_current_object()
+    config = app.config
+    if not logging.getLogger().handlers:
+        logging.basicConfig(level=logging.INFO, format="[%(asctime)s] [%(process)d] %(message)s")
+    PreforkServer(
+        app,
+        host=host,
+        port=port,
+        workers=workers if workers is not None else config["SERVE_WORKERS"],
+        max_requests=max_requests if max_requests is not None else config["SERVE_MAX_REQUESTS"],
+        max_requests_jitter=(max_requests_jitter if max_requests_jitter is not None
+                             else config["SERVE_MAX_REQUESTS_JITTER"]),
+        max_rss=(max_rss if max_rss is not None else config["SERVE_MAX_RSS_MB"]) * 1024 * 1024,
+        graceful_timeout=graceful_timeout if graceful_timeout is not None else config["SERVE_GRACEFUL_TIMEOUT"],
+    ).run()
+
+
+if __name__ == "__main__":
+    from flaskblog import create_app
+
+    with create_app().app_context():
+        serve()
@@ -0,0 +1,57 @@
+// Live availability hints for the username and email fields of forms marked
+// with data-availability-url. A taken value marks the field invalid before
+// the form is submitted; the server still checks on submit, so failed or
+// missing requests only mean no hint is shown.
+const availabilityMessages = {
+    username: "That username is taken. Please choose a different one.",
+    email: "That email is taken. Please choose a different one.",
+};
+
+document.querySelectorAll("[data-availability-url]").forEach((form) => {
+    Object.keys(availabilityMessages).forEach((name) => {
+        const field = form.elements[name];
+        if (!field) {
+            return;
+        }
+        let timer = null;
+        field.addEventListener("input", () => {
+            clearTimeout(timer);
+            timer = setTimeout(() => check(form, field, name), 400);
+        });
+    });
+});
+
+async function check(form, field, name) {
+    const value = field.value.trim();
+    let hint = field.parentElement.querySelector("[data-availability-hint]");
+    if (!value) {
+        setTaken(field, hint, false);
+        return;
+    }
+    const url = new URL(form.dataset.availabilityUrl, window.location.href);
+    url.searchParams.set(name, value);
+    try {
+        const response = await fetch(url, { headers: { Accept: "application/json" } });
+        if (!response.ok || field.value.trim() !== value) {
+            return;
+        }
+        const data = await response.json();
+        if (!hint) {
+            hint = document.createElement("div");
+            hint.className = "invalid-feedback";
+            hint.dataset.availabilityHint = "";
+            hint.textContent = availabilityMessages[name];
+            field.after(hint);
+        }
+        setTaken(field, hint, !data[name]);
+    } catch (error) {
+        // No hint; the form is validated on submit anyway.
+    }
+}
+
+function setTaken(field, hint, taken) {
+    field.classList.toggle("is-invalid", taken);
+    if (hint) {
+        hint.hidden = !taken;
+    }
+}
@@ -0,0 +1,54 @@
+// Progressive enhancement for like buttons: the form is posted in the
+// background asking for JSON, and the button and count are updated in place.
+// The form is submitted normally only when the request certainly did not
+// toggle the like: when it never got a response, or when it was redirected
+// (for example to the login page). Errors from the server, such as 429 Too
+// Many Requests, are shown next to the button instead of posting again,
+// which could flip the like back.
+document.addEventListener("submit", async (event) => {
+    const form = event.target.closest("[data-like-form]");
+    if (!form) {
+        return;
+    }
+    event.preventDefault();
+
+    const button = form.querySelector("[data-like-button]");
+    const error = form.querySelector("[data-like-error]");
+    error.hidden = true;
+    button.disabled = true;
+    let response;
+    try {
+        response = await fetch(form.action, {
+            method: "POST",
+            headers: { Accept: "application/json" },
+            credentials: "same-origin",
+            redirect: "manual",
+        });
+    } catch (failure) {
+        form.submit();
+        return;
+    }
+    try {
+        if (response.type === "opaqueredirect") {
+            form.submit();
+            return;
+        }
+        if (!response.ok) {
+            const retryAfter = response.headers.get("Retry-After");
+            error.textContent = response.status === 429 && retryAfter
+                ? `Too many likes; try again in ${retryAfter} seconds.`
+                : "Could not update your like. Please try again.";
+            error.hidden = false;
+            return;
+        }
+        const data = await response.json();
+        button.textContent = data.liked ? "Unlike" : "Like";
+        form.querySelector("[data-like-count]").textContent = data.likes;
+    } catch (failure) {
+        // The like may have been toggled; reloading shows the current state.
+        error.textContent = "Could not update your like. Reload the page to see it.";
+        error.hidden = false;
+    } finally {
+        button.disabled = false;
+    }
+});
@@ -0,0 +1,46 @@
+// Live updates for the post page: new comments and like counts arrive over
+// Server-Sent Events. EventSource reconnects by itself, sending the ID of the
+// last event it received so the server can replay what was missed; a "reset"
+// event means too much was missed and the page is reloaded instead.
+(() => {
+    const article = document.querySelector("[data-events-url]");
+    if (!article || !window.EventSource) {
+        return;
+    }
+    const source = new EventSource(article.dataset.eventsUrl);
+
+    source.addEventListener("likes", (event) => {
+        const data = JSON.parse(event.data);
+        for (const count of document.querySelectorAll("[data-like-count]")) {
+            count.textContent = data.likes;
+        }
+    });
+
+    // Comments are listed in path order, so a new comment or reply goes
+    // before the first comment with a greater path, if it is on this page.
+    source.addEventListener("comment", (event) => {
+        const data = JSON.parse(event.data);
+        const comments = document.querySelector("[data-comments]");
+        if (!comments || comments.querySelector(`[data-comment-id="${data.id}"]`)) {
+            return;
+        }
+        const template = document.createElement("template");
+        template.innerHTML = data.html.trim();
+        const comment = template.content.firstElementChild;
+        const path = comment.dataset.commentPath;
+        if (path < comments.dataset.commentsStart) {
+            return;
+        }
+        const next = Array.from(comments.children).find((other) => other.dataset.commentPath > path);
+        if (next) {
+            comments.insertBefore(comment, next);
+        } else if (!("commentsMore" in comments.dataset)) {
+            comments.append(comment);
+        }
+    });
+
+    source.addEventListener("reset", () => {
+        source.close();
+        window.location.reload();
+    });
+})();
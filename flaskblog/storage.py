@@ -0,0 +1,182 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from flask import url_for
+
+
+class LocalStorage:
+    """
+    Stores media files in a directory on the local filesystem.
+
+    Files are served as static files, or from `base_url` (for example a CDN
+    in front of the directory) when one is configured. Only suitable when
+    every app node shares the directory.
+    """
+
+    def __init__(self, root, base_url=None):
+        self.root = root
+        self.base_url = base_url.rstrip("/") if base_url else None
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def save(self, key, stream, content_type=None):
+        """
+        Streams a file object to disk, replacing any existing file atomically.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as tmp:
+            shutil.copyfileobj(stream, tmp)
+        # mkstemp creates files readable by their owner only; the web server
+        # serving the static folder may run as another user.
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def url(self, key):
+        if self.base_url:
+            return f"{self.base_url}/{key}"
+        return url_for("static", filename=key)
+
+
+class S3Storage:
+    """
+    Stores media files in an S3-compatible object store. Requires `boto3`.
+
+    Uploads are streamed in chunks (multipart for large files). Browsers
+    fetch files straight from the store, or from `public_url` (a CDN) when
+    configured; otherwise from presigned URLs, which are cached in process
+    until shortly before they expire.
+
+    `endpoint_url` points the client at any S3-compatible server, such as a
+    local MinIO instance for development.
+    """
+
+    def __init__(self, bucket, endpoint_url=None, region=None, public_url=None,
+                 url_expiry=3600):
+        import boto3
+
+        self.bucket = bucket
+        self.public_url = public_url.rstrip("/") if public_url else None
+        self.url_expiry = url_expiry
+        self._client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+        self._urls = {}
+        self._lock = threading.Lock()
+
+    def save(self, key, stream, content_type=None):
+        extra = {"CacheControl": "public, max-age=31536000, immutable"}
+        if content_type:
+            extra["ContentType"] = content_type
+        self._client.upload_fileobj(stream, self.bucket, key, ExtraArgs=extra)
+
+    def delete(self, key):
+        self._client.delete_object(Bucket=self.bucket, Key=key)
+        with self._lock:
+            self._urls.pop(key, None)
+
+    def url(self, key):
+        if self.public_url:
+            return f"{self.public_url}/{key}"
+        now = time.time()
+        with self._lock:
+            cached = self._urls.get(key)
+        if cached and cached[1] > now:
+            return cached[0]
+        url = self._client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=self.url_expiry
+        )
+        with self._lock:
+            # Reuse the URL until a tenth of its lifetime is left.
+            self._urls[key] = (url, now + self.url_expiry * 0.9)
+        return url
+
+
+class MediaStorage:
+    """
+    Flask extension giving the app one media storage backend.
+
+    `MEDIA_STORAGE` selects "local" (the app's static folder) or "s3". The
+    `media_url` and `avatar_url` template globals build URLs through the
+    backend, so pages never hard-code where files live.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Creates the configured storage backend for an application.
+
+        Args:
+            app (Flask): The application.
+        """
+        config = app.config
+        config.setdefault("MEDIA_STORAGE", "local")
+        config.setdefault("MEDIA_URL", None)
+        if config["MEDIA_STORAGE"] == "s3":
+            self.backend = S3Storage(
+                config["S3_BUCKET"],
+                endpoint_url=config.get("S3_ENDPOINT_URL"),
+                region=config.get("S3_REGION"),
+                public_url=config["MEDIA_URL"],
+                url_expiry=config.get("S3_URL_EXPIRY", 3600),
+            )
+        elif config["MEDIA_STORAGE"] == "local":
+            self.backend = LocalStorage(app.static_folder, base_url=config["MEDIA_URL"])
+        else:
+            raise ValueError(f"Unsupported MEDIA_STORAGE: {config['MEDIA_STORAGE']}")
+        app.extensions["media_storage"] = self
+        app.add_template_global(self.url, "media_url")
+        app.add_template_global(self.avatar_url, "avatar_url")
+
+    def save(self, key, stream, content_type=None):
+        """
+        Stores a file under a key, streaming it from a file object.
+
+        Args:
+            key (str): The storage key, such as "profile_pics/1a2b.jpg".
+            stream: A readable binary file object.
+            content_type (str): The MIME type of the file.
+        """
+        self.backend.save(key, stream, content_type)
+
+    def delete(self, key):
+        """
+        Deletes a stored file; missing files are ignored.
+        """
+        self.backend.delete(key)
+
+    def url(self, key):
+        """
+        Returns the public URL of a stored file.
+        """
+        return self.backend.url(key)
+
+    def avatar_url(self, image_file):
+        """
+        Returns the URL of a profile picture.
+
+        The shared default picture ships with the app and is always served as
+        a static file.
+
+        Args:
+            image_file (str): The `User.image_file` value.
+
+        Returns:
+            str: The picture's URL.
+        """
+        if image_file == "default.jpg":
+            return url_for("static", filename="profile_pics/default.jpg")
+        return self.url(f"profile_pics/{image_file}")
@@ -0,0 +1,20 @@
+import click
+from flask.cli import AppGroup
+
+from flaskblog.users.utils import repair_user_stats
+
+users_cli = AppGroup("users", help="Maintenance commands for users.")
+
+
+@users_cli.command("repair-stats")
+@click.option("--batch-size", type=int, default=500, show_default=True, help="Users counted per transaction.")
+def repair_stats_command(batch_size):
+    """
+    Recounts the posts, likes and comments shown on every profile and fixes
+    the statistics that drifted.
+
+    Posting, liking, commenting and deleting keep the statistics up to date;
+    run this after importing or deleting rows directly in the database.
+    """
+    checked, repaired = repair_user_stats(batch_size)
+    click.echo(f"Checked {checked} user(s), repaired {repaired}.")
@@ -3,7 +3,6 @@ from flask_wtf.file import FileField, FileAllowed
 from wtforms import StringField, PasswordField, SubmitField, BooleanField
 from wtforms.validators import DataRequired, Length, Email, EqualTo, ValidationError
 from flaskblog.models import User
-from flask_login import current_user
 
 
 
@@ -11,6 +10,10 @@ class RegistrationForm(FlaskForm):
     """
     Form for user registration.
 
+    Usernames and emails are not checked for uniqueness here; the unique
+    constraints reject duplicates when the user is saved, and the view turns
+    the error into field errors.
+
     Attributes:
         username (StringField): The user's chosen username.
         email (StringField): The user's email address.
@@ -36,34 +39,6 @@ class RegistrationForm(FlaskForm):
     )
     submit = SubmitField("Sign Up")
 
-    def validate_username(self, username):
-        """
-        Validates that the username is not already taken.
-
-        Args:
-            username (StringField): The username field to validate.
-
-        Raises:
-            ValidationError: If the username is already in use.
-        """
-        user = User.query.filter_by(username=username.data).first()
-        if user:
-            raise ValidationError("That username is taken. Please choose a different one.")
-
-    def validate_email(self, email):
-        """
-        Validates that the email is not already registered.
-
-        Args:
-            email (StringField): The email field to validate.
-
-        Raises:
-            ValidationError: If the email is already in use.
-        """
-        user = User.query.filter_by(email=email.data).first()
-        if user:
-            raise ValidationError("That email is taken. Please choose a different one.")
-
 
 class LoginForm(FlaskForm):
     """
@@ -91,6 +66,8 @@ class UpdateAccountForm(FlaskForm):
     """
     Form for updating a user's account information.
 
+    Like `RegistrationForm`, uniqueness is left to the unique constraints.
+
     Attributes:
         username (StringField): The user's new username.
         email (StringField): The user's new email address.
@@ -111,36 +88,6 @@ class UpdateAccountForm(FlaskForm):
     )
     submit = SubmitField("Update")
 
-    def validate_username(self, username):
-        """
-        Validates that the new username is not already taken by another user.
-
-        Args:
-            username (StringField): The username field to validate.
-
-        Raises:
-            ValidationError: If the new username is already in use.
-        """
-        if username.data != current_user.username:
-            user = User.query.filter_by(username=username.data).first()
-            if user:
-                raise ValidationError("This username is taken. Please choose a different one")
-
-    def validate_email(self, email):
-        """
-        Validates that the new email is not already registered by another user.
-
-        Args:
-            email (StringField): The email field to validate.
-
-        Raises:
-            ValidationError: If the new email is already in use.
-        """
-        if email.data != current_user.email:
-            user = User.query.filter_by(email=email.data).first()
-            if user:
-                raise ValidationError("This email is taken. Please choose a different one")
-
 
 class RequestResetForm(FlaskForm):
     """
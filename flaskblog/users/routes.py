@@ -1,9 +1,12 @@
-from flaskblog.models import User, Post
-from flask import render_template, url_for, flash, redirect, request, Blueprint
+from flaskblog.models import User, Post, Follow
+from flask import render_template, url_for, flash, redirect, request, Blueprint, abort, jsonify
+from sqlalchemy.exc import IntegrityError
 from flaskblog.users.forms import RegistrationForm, LoginForm, UpdateAccountForm, RequestResetForm, ResetPasswordForm
-from flaskblog import db, bcrypt
+from flaskblog import db, bcrypt, limiter, storage, availability
 from flask_login import login_user, current_user, logout_user, login_required
-from flaskblog.users.utils import send_reset_email, save_picture
+from flaskblog.users.utils import send_reset_email, save_picture, user_stats, add_taken_errors, is_taken
+from flaskblog.main.utils import follow, unfollow
+from flaskblog.feeds.utils import refresh_user_artifacts
 
 
 
@@ -16,7 +19,9 @@ def register():
 
     If the user is already authenticated, they are redirected to the home page.
     Otherwise, it processes the registration form. On successful submission,
-    a new user is created and saved to the database.
+    a new user is created and saved to the database. Duplicate usernames and
+    emails are caught by the unique constraints when the user is inserted,
+    so a valid submission takes a single round trip.
 
     Returns:
         A rendered registration template, a redirect to the home page when the user is already
@@ -29,13 +34,20 @@ def register():
         hashed_password = bcrypt.generate_password_hash(form.password.data).decode("utf-8")
         user = User(username=form.username.data, email=form.email.data, password=hashed_password)
         db.session.add(user)
-        db.session.commit()
-        flash(f"Your account has been created! You are now able to log in ", "success")
-        return redirect(url_for("users.login"))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            add_taken_errors(form)
+        else:
+            availability.add(username=form.username.data, email=form.email.data)
+            flash(f"Your account has been created! You are now able to log in ", "success")
+            return redirect(url_for("users.login"))
     return render_template('register.html', title="Register", form=form)
 
 
 @users.route("/login", methods=["POST", "GET"])
+@limiter.limit
 def login():
     """
     Handles user login.
@@ -43,6 +55,7 @@ def login():
     If the user is already authenticated, they are redirected to the home page.
     Otherwise, it processes the login form. On successful validation, the user
     is logged in and redirected to the home page or their intended destination.
+    Login attempts are rate limited per IP address.
 
     Returns:
         A rendered login template or a redirect to the home page.
@@ -80,25 +93,70 @@ def account():
     Handles user account management.
 
     Allows authenticated users to update their username, email, and profile picture.
+    A new username is written into the stored feeds that name the user. A
+    username or email already in use is rejected by the unique constraints
+    and shown as a field error. The page shows the user's statistics, read
+    with one primary key lookup.
 
     Returns:
         A rendered account template with the user's information.
     """
     form = UpdateAccountForm()
     if form.validate_on_submit():
+        picture_file = None
         if form.picture.data:
             picture_file = save_picture(form.picture.data)
             current_user.image_file = picture_file
+        renamed = current_user.username != form.username.data
         current_user.username = form.username.data
         current_user.email = form.email.data
-        db.session.commit()
-        flash("Your account has been updated", "success")
-        return redirect(url_for("users.account"))
+        try:
+            if renamed:
+                db.session.flush()
+                refresh_user_artifacts(current_user)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            if picture_file:
+                # The rolled back user never pointed at the new picture.
+                storage.delete("profile_pics/" + picture_file)
+            add_taken_errors(form, current_user.id)
+        else:
+            availability.add(username=form.username.data, email=form.email.data)
+            flash("Your account has been updated", "success")
+            return redirect(url_for("users.account"))
     elif request.method == "GET":
         form.username.data = current_user.username
         form.email.data = current_user.email
-    image_file = url_for("static", filename="/profile_pics/" + current_user.image_file)
-    return render_template("account.html", title="Account", image_file=image_file, form=form)
+    image_file = storage.avatar_url(current_user.image_file)
+    return render_template("account.html", title="Account", image_file=image_file, form=form,
+                           stats=user_stats(current_user.id))
+
+
+@users.route("/api/availability")
+@limiter.limit
+def availability_check():
+    """
+    Tells whether a username and/or email are free, for live checks while
+    filling in a form.
+
+    Values the in-memory availability filter has never seen are answered
+    without touching the database. A free answer is a hint, not a
+    reservation: the unique constraints decide when the form is submitted.
+    The values are read from the `username` and `email` query arguments, at
+    least one of which is required.
+
+    Returns:
+        JSON mapping each given field to whether its value is available.
+    """
+    result = {}
+    for field in ("username", "email"):
+        value = request.args.get(field, "").strip()
+        if value:
+            result[field] = not is_taken(field, value)
+    if not result:
+        abort(400)
+    return jsonify(result)
 
 
 @users.route("/user/<string:username>")
@@ -106,6 +164,10 @@ def user_posts(username):
     """
     Displays all posts by a specific user.
 
+    The post, like and comment counts come from the user's maintained
+    statistics in one primary key lookup; the post count also sizes the
+    pagination, so no posts are counted per visit.
+
     Args:
         username (str): The username of the user whose posts are to be displayed.
 
@@ -114,13 +176,51 @@ def user_posts(username):
     """
     page = request.args.get('page', 1, type=int)
     user = User.query.filter_by(username=username).first_or_404()
-    posts = Post.query.filter_by(author=user)\
+    stats = user_stats(user.id)
+    posts = Post.visible().filter_by(author=user)\
             .order_by(Post.date.desc())\
-            .paginate(page=page, per_page=5)
-    return render_template('user_posts.html', title='Post By ' + user.username, posts=posts, user=user)
+            .paginate(page=page, per_page=5, count=False)
+    posts.total = stats.post_count
+    is_following = (
+        current_user.is_authenticated
+        and db.session.get(Follow, (current_user.id, user.id)) is not None
+    )
+    return render_template('user_posts.html', title='Post By ' + user.username, posts=posts, user=user,
+                           stats=stats, is_following=is_following)
+
+
+@users.route("/user/<string:username>/follow", methods=["POST"])
+@login_required
+def follow_user(username):
+    """
+    Toggles whether the current user follows another user.
+
+    Following copies the author's recent posts into the current user's
+    timeline; unfollowing removes them.
+
+    Args:
+        username (str): The username of the user to follow or unfollow.
+
+    Returns:
+        A redirect to the user's posts page.
+    """
+    user = User.query.filter_by(username=username).first_or_404()
+    if user == current_user:
+        flash("You cannot follow yourself.", "warning")
+        return redirect(url_for("users.user_posts", username=username))
+
+    if db.session.get(Follow, (current_user.id, user.id)):
+        unfollow(current_user, user)
+        flash(f"You are no longer following {user.username}.", "info")
+    else:
+        follow(current_user, user)
+        flash(f"You are now following {user.username}!", "success")
+    db.session.commit()
+    return redirect(url_for("users.user_posts", username=username))
 
 
 @users.route("/reset_password", methods=["POST", "GET"])
+@limiter.limit
 def reset_request():
     """
     Handles the request for a password reset email.
@@ -1,9 +1,13 @@
+import io
 import os
 import secrets
 from PIL import Image
-from flask import url_for, current_app
+from flask import flash, url_for
 from flask_mail import Message
-from flaskblog import mail
+from sqlalchemy import func, or_, select
+from flaskblog import availability, db, mail, storage
+from flaskblog.dbutils import upsert
+from flaskblog.models import User, Post, Like, Comment, UserStats
 
 
 
@@ -12,8 +16,8 @@ def save_picture(form_picture):
     Saves and resizes a user's profile picture.
 
     The function generates a random hex filename to prevent collisions, resizes
-    the image to 125x125 pixels, and saves it to the `static/profile_pics`
-    directory.
+    the image to 125x125 pixels, and stores it under `profile_pics/` in the
+    configured media storage (the static folder or an object store).
 
     Args:
         form_picture (FileStorage): The picture file uploaded by the user
@@ -25,12 +29,15 @@ def save_picture(form_picture):
     random_hex = secrets.token_hex(8)
     _, file_extension = os.path.splitext(form_picture.filename)
     picture_filename = random_hex + file_extension
-    picture_path = os.path.join(current_app.root_path, "static/profile_pics", picture_filename)
 
     output_size = (125, 125)
     i = Image.open(form_picture)
     i.thumbnail(output_size)
-    i.save(picture_path)
+    image_format = Image.registered_extensions()[file_extension.lower()]
+    buffer = io.BytesIO()
+    i.save(buffer, format=image_format)
+    buffer.seek(0)
+    storage.save("profile_pics/" + picture_filename, buffer, Image.MIME.get(image_format))
 
     return picture_filename
 
@@ -52,4 +59,151 @@ def send_reset_email(user):
 
 If you did not make this request then simply ignore this email and no changes will be made.
 """
-    mail.send(msg)
\ No newline at end of file
+    mail.send(msg)
+
+
+def adjust_user_stats(user_id, posts=0, likes=0, comments=0):
+    """
+    Adds to a user's profile statistics in the current transaction.
+
+    A single upsert, so the counts change atomically with the post, like or
+    comment write that calls it.
+
+    Args:
+        user_id (int): The ID of the user.
+        posts (int): The change in the number of visible posts.
+        likes (int): The change in likes received on visible posts.
+        comments (int): The change in comments received on visible posts.
+    """
+    upsert(UserStats, [{"user_id": user_id, "post_count": posts, "likes_received": likes,
+                        "comments_received": comments}],
+           index_elements=["user_id"], increment_columns=["post_count", "likes_received", "comments_received"])
+
+
+def user_stats(user_id):
+    """
+    Loads a user's profile statistics with one primary key lookup.
+
+    Args:
+        user_id (int): The ID of the user.
+
+    Returns:
+        UserStats: The statistics, all zero for users who never posted or
+        received anything.
+    """
+    return db.session.get(UserStats, user_id) or UserStats(user_id=user_id, post_count=0, likes_received=0,
+                                                            comments_received=0)
+
+
+def repair_user_stats(batch_size=500):
+    """
+    Recomputes the profile statistics of every user and fixes any that drifted.
+
+    Users are walked in primary key order; each batch is counted with one
+    grouped query per table, restricted to the batch's users, and written in
+    its own transaction. A write that lands between a batch's counts and its
+    update can still leave that user off by one, so run it at a quiet time.
+
+    Args:
+        batch_size (int): The number of users per batch.
+
+    Returns:
+        tuple: `(checked, repaired)` numbers of users.
+    """
+    checked = repaired = 0
+    last_id = 0
+    while True:
+        user_ids = db.session.scalars(
+            select(User.id).where(User.id > last_id).order_by(User.id).limit(batch_size)
+        ).all()
+        if not user_ids:
+            return checked, repaired
+        last_id = user_ids[-1]
+
+        visible = (Post.user_id.in_(user_ids), Post.deleted_at.is_(None))
+        posts = dict(db.session.execute(
+            select(Post.user_id, func.count()).where(*visible).group_by(Post.user_id)
+        ).all())
+        likes = dict(db.session.execute(
+            select(Post.user_id, func.count()).join(Like, Like.post_id == Post.id).where(*visible)
+            .group_by(Post.user_id)
+        ).all())
+        comments = dict(db.session.execute(
+            select(Post.user_id, func.count()).join(Comment, Comment.post_id == Post.id).where(*visible)
+            .group_by(Post.user_id)
+        ).all())
+        stored = {stats.user_id: stats for stats in db.session.scalars(
+            select(UserStats).where(UserStats.user_id.in_(user_ids))
+        )}
+
+        rows = []
+        for user_id in user_ids:
+            actual = (posts.get(user_id, 0), likes.get(user_id, 0), comments.get(user_id, 0))
+            current = stored.get(user_id)
+            if current is not None and (current.post_count, current.likes_received,
+                                        current.comments_received) == actual:
+                continue
+            rows.append({"user_id": user_id, "post_count": actual[0], "likes_received": actual[1],
+                         "comments_received": actual[2]})
+        upsert(UserStats, rows, index_elements=["user_id"],
+               update_columns=["post_count", "likes_received", "comments_received"])
+        db.session.commit()
+        checked += len(user_ids)
+        repaired += len(rows)
+
+
+TAKEN_MESSAGES = {
+    "username": "That username is taken. Please choose a different one.",
+    "email": "That email is taken. Please choose a different one.",
+}
+
+
+def add_taken_errors(form, user_id=None):
+    """
+    Marks the form fields whose values another user already has.
+
+    Called after the unique constraints rejected a user, once the session
+    has been rolled back. Saving never checks beforehand, so this one
+    lookup only happens when a duplicate was actually submitted.
+
+    Args:
+        form (FlaskForm): The registration or account form, with `username`
+                          and `email` fields.
+        user_id (int, optional): The user being updated, whose own values
+                                 don't count.
+    """
+    query = select(User.username, User.email).where(
+        or_(User.username == form.username.data, User.email == form.email.data)
+    )
+    if user_id is not None:
+        query = query.where(User.id != user_id)
+    taken = set()
+    for username, email in db.session.execute(query):
+        if username == form.username.data:
+            taken.add("username")
+        if email == form.email.data:
+            taken.add("email")
+    for field in taken:
+        form[field].errors.append(TAKEN_MESSAGES[field])
+    if not taken:
+        flash("Your account could not be saved. Please try again.", "danger")
+
+
+def is_taken(field, value):
+    """
+    Tells whether a username or email is in use.
+
+    Values the in-memory availability filter has never seen are answered
+    without a query; the rest are looked up by their unique index.
+
+    Args:
+        field (str): "username" or "email".
+        value (str): The value to check.
+
+    Returns:
+        bool: True if a user has the value.
+    """
+    if not availability.might_be_taken(field, value):
+        return False
+    column = getattr(User, field)
+    return db.session.scalar(select(User.id).where(column == value)) is not None
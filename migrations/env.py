@@ -97,14 +97,28 @@ def run_migrations_online():
     connectable = get_engine()
 
     with connectable.connect() as connection:
+        # Batch migrations recreate SQLite tables by copying and dropping them;
+        # with foreign keys enforced, dropping a parent table would cascade.
+        if connection.dialect.name == "sqlite":
+            connection.exec_driver_sql("PRAGMA foreign_keys=OFF")
+            connection.commit()
+
         context.configure(
             connection=connection,
             target_metadata=get_metadata(),
             **conf_args
         )
 
-        with context.begin_transaction():
-            context.run_migrations()
+        if getattr(config.cmd_opts, 'autogenerate', False):
+            with context.begin_transaction():
+                context.run_migrations()
+            return
+
+        # Keep the site read-only while tables are being rewritten: writes get
+        # 503 right away and anonymous readers get page snapshots.
+        with current_app.extensions['read_only'].engaged():
+            with context.begin_transaction():
+                context.run_migrations()
 
 
 if context.is_offline_mode():
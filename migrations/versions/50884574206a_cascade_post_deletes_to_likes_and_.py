@@ -0,0 +1,51 @@
+"""Cascade post deletes to likes and comments
+
+Revision ID: 50884574206a
+Revises: 93c99395c76c
+Create Date: 2026-10-19 11:31:19.304945
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '50884574206a'
+down_revision = '93c99395c76c'
+branch_labels = None
+depends_on = None
+
+# The original foreign keys were created without names. SQLite batch mode
+# names reflected constraints with this convention so they can be dropped.
+naming_convention = {
+    "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
+}
+
+
+def post_fk_name(table):
+    if op.get_bind().dialect.name == "sqlite":
+        return f"fk_{table}_post_id_post"
+    # PostgreSQL's default name for an unnamed foreign key.
+    return f"{table}_post_id_fkey"
+
+
+def upgrade():
+    for table in ('comment', 'like'):
+        with op.batch_alter_table(table, schema=None, naming_convention=naming_convention) as batch_op:
+            batch_op.drop_constraint(post_fk_name(table), type_='foreignkey')
+            batch_op.create_foreign_key(post_fk_name(table), 'post', ['post_id'], ['id'], ondelete='CASCADE')
+
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_post_deleted_at'), ['deleted_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_post_deleted_at'))
+        batch_op.drop_column('deleted_at')
+
+    for table in ('like', 'comment'):
+        with op.batch_alter_table(table, schema=None, naming_convention=naming_convention) as batch_op:
+            batch_op.drop_constraint(post_fk_name(table), type_='foreignkey')
+            batch_op.create_foreign_key(post_fk_name(table), 'post', ['post_id'], ['id'])